@@ -0,0 +1,378 @@
+"""
+Benchmarks de rendimiento contra un servidor Deck falso local (fake_deck_server.py).
+
+Mide la descarga con DeckAPIClient, el rendimiento de save_stacks_and_cards, la velocidad
+de reenvío de la cola offline, el pintado de populate_card_list (Qt offscreen), el
+tiempo de arranque, el pico de memoria al guardar un tablero leído por lotes, las
+escrituras simultáneas desde varios hilos y la memoria de un tablero cargado para mostrarlo. Los resultados se pueden guardar como JSON para comparar commits.
+
+Uso:
+    python benchmark.py [--boards N] [--stacks N] [--cards N] [--latency S] [--error-rate F]
+                        [--stream-cards N] [--batch-size N] [--only NOMBRE ...]
+                        [--output resultados.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from data_manager import DataManager
+from database_manager import DatabaseManager
+from deck_api_client import DeckAPIClient, RetryPolicy
+from fake_deck_server import FakeDeckServer, make_stacks
+from json_stream import StacksStreamParser, iter_batches
+from metrics import metrics
+
+BENCHMARKS = ('api_fetch', 'save', 'offline_replay', 'render', 'startup', 'stream_memory', 'write_contention',
+              'board_memory')
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 1) if seconds else None
+
+
+def _save_row_by_row(db, board_id, stacks):
+    """Ruta de escritura anterior: una transacción por fila (referencia para comparar)."""
+    def execute(query, params):
+        # Cada sentencia es una operación aparte del hilo escritor, con su propio commit
+        db._write(db._execute, query, params, commit=True)
+
+    execute("DELETE FROM stacks WHERE board_id = ?", (board_id,))
+    execute("DELETE FROM cards WHERE board_id = ?", (board_id,))
+    for stack in stacks:
+        execute("INSERT OR REPLACE INTO stacks (id, board_id, title, \"order\") VALUES (?, ?, ?, ?)",
+                (stack['id'], board_id, stack['title'], stack.get('order')))
+        for card in stack.get('cards', []):
+            execute(
+                "INSERT OR REPLACE INTO cards (id, stack_id, board_id, title, description, duedate, labels_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (card['id'], stack['id'], board_id, card['title'], card.get('description'),
+                 card.get('duedate'), json.dumps(card.get('labels', []))))
+
+
+def _client(server):
+    return DeckAPIClient(server.url, 'bench', 'bench', retry_policy=RetryPolicy(backoff_factor=0.01))
+
+
+def bench_api_fetch(server):
+    """Tiempo de descarga de todos los tableros, en serie con DeckAPIClient y en paralelo."""
+    client = _client(server)
+    start = time.perf_counter()
+    boards = client.get_boards()
+    per_board = []
+    for board in boards:
+        board_start = time.perf_counter()
+        client.get_stacks_with_cards(board['id'])
+        per_board.append(time.perf_counter() - board_start)
+    sequential = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DataManager(os.path.join(tmp, 'bench.db'))
+        manager.api = client
+        start = time.perf_counter()
+        manager.refresh_all_boards()
+        parallel = time.perf_counter() - start
+        manager.close()
+    per_board.sort()
+    return {
+        'boards': len(boards),
+        'sequential_seconds': round(sequential, 4),
+        'board_fetch_p50_seconds': round(per_board[len(per_board) // 2], 4) if per_board else None,
+        'board_fetch_max_seconds': round(per_board[-1], 4) if per_board else None,
+        'parallel_refresh_with_save_seconds': round(parallel, 4),
+    }
+
+
+def bench_save_stacks_and_cards(n_boards, n_stacks, n_cards):
+    """Compara tarjetas/segundo entre la escritura fila a fila y la escritura por lotes."""
+    results = {}
+    total_cards = n_boards * n_stacks * n_cards
+    for name, save in (('row_by_row', _save_row_by_row),
+                       ('batched', lambda db, board_id, stacks: db.save_stacks_and_cards(board_id, stacks))):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+            elapsed = 0.0
+            # Los tableros se generan de uno en uno para no tenerlos todos en memoria a la vez
+            for board_id in range(1, n_boards + 1):
+                stacks = make_stacks(board_id, n_stacks, n_cards)
+                start = time.perf_counter()
+                save(db, board_id, stacks)
+                elapsed += time.perf_counter() - start
+            db.close()
+        results[name] = {'seconds': round(elapsed, 4), 'cards_per_second': _rate(total_cards, elapsed)}
+    return results
+
+
+def bench_stream_memory(n_stacks, n_cards, batch_size):
+    """
+    Pico de memoria de Python (tracemalloc) y tiempo al guardar un tablero a partir del cuerpo
+    de la respuesta: json.loads + save_stacks_and_cards frente a la lectura incremental por
+    lotes + save_stacks_and_cards_stream. El cuerpo se codifica antes de medir.
+    """
+    payload = json.dumps(make_stacks(1, n_stacks, n_cards)).encode()
+    chunk_size = 64 * 1024
+
+    def full(db):
+        return db.save_stacks_and_cards(1, json.loads(payload))
+
+    def streamed(db):
+        chunks = (payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size))
+        return db.save_stacks_and_cards_stream(1, iter_batches(StacksStreamParser(chunks), batch_size))
+
+    results = {'cards': n_stacks * n_cards, 'payload_bytes': len(payload), 'batch_size': batch_size}
+    for name, save in (('full', full), ('streamed', streamed)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+            tracemalloc.start()
+            start = time.perf_counter()
+            changes = save(db)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            db.close()
+        results[name] = {'seconds': round(elapsed, 4), 'peak_mib': round(peak / 2 ** 20, 2),
+                         'cards_saved': len(changes['cards']['added'])}
+    return results
+
+
+def bench_board_memory(n_stacks, n_cards, description_sizes=(100, 10_000)):
+    """
+    Memoria que ocupa un tablero cargado con get_board_contents según el tamaño de las
+    descripciones: con las consultas de la lista no debería depender de él.
+    """
+    results = {'cards': n_stacks * n_cards}
+    for size in description_sizes:
+        stacks = make_stacks(1, n_stacks, n_cards)
+        for stack in stacks:
+            for card in stack['cards']:
+                card['description'] = "x" * size
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+            db.save_stacks_and_cards(1, stacks)
+            del stacks
+            tracemalloc.start()
+            board = db.get_board_contents(1)
+            retained = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del board
+            db.close()
+        results[f'description_{size}_chars_kib'] = round(retained / 1024, 1)
+    return results
+
+
+def bench_write_contention(n_threads, n_writes):
+    """
+    Varios hilos escriben a la vez (como los workers del QThreadPool): escrituras por segundo
+    y número de commits del hilo escritor, que agrupa en un lote las que llegan juntas.
+    """
+    was_enabled = metrics.enabled
+    metrics.enable()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        batches_before = _counter('db_write_batches')
+
+        def write(thread):
+            for i in range(n_writes):
+                db.queue_offline_change('PUT', f'boards/1/stacks/1/cards/{thread * n_writes + i}', {'title': str(i)})
+
+        threads = [threading.Thread(target=write, args=(thread,)) for thread in range(n_threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        commits = _counter('db_write_batches') - batches_before
+        db.close()
+    if not was_enabled:
+        metrics.disable()
+    total = n_threads * n_writes
+    return {'threads': n_threads, 'writes': total, 'commits': commits, 'seconds': round(elapsed, 4),
+            'writes_per_second': _rate(total, elapsed)}
+
+
+def _counter(name):
+    return sum(m['value'] for m in metrics.to_json()['counters'] if m['name'] == name)
+
+
+def bench_offline_replay(server, n_changes):
+    """Cambios por segundo al reenviar la cola offline contra el servidor falso."""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DataManager(os.path.join(tmp, 'bench.db'))
+        manager.api = _client(server)
+        for i in range(n_changes):
+            board_id = i % server.n_boards + 1
+            manager.db.queue_offline_change(
+                'PUT', f'boards/{board_id}/stacks/{board_id * 1_000}/cards/{board_id * 1_000_000 + i + 1}',
+                {'title': f"Editada {i}"})
+        start = time.perf_counter()
+        synced = manager.sync_offline_changes()
+        elapsed = time.perf_counter() - start
+        pending = len(manager.db.get_offline_changes())
+        manager.close()
+    return {'changes': n_changes, 'synced': synced, 'pending': pending, 'seconds': round(elapsed, 4),
+            'changes_per_second': _rate(synced, elapsed)}
+
+
+def bench_render(n_cards):
+    """Tiempo de populate_card_list más el primer pintado de una pila de n_cards tarjetas."""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication, QListView
+    import kanban_app
+
+    app = QApplication.instance() or QApplication([])
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        db.save_stacks_and_cards(1, make_stacks(1, 1, n_cards))
+        cards = db.get_cards(1_000)
+        db.close()
+
+    view = QListView()
+    view.setModel(kanban_app.CardListModel(view))
+    view.setItemDelegate(kanban_app.CardDelegate(view))
+    view.setResizeMode(QListView.Adjust)
+    view.setStyleSheet(kanban_app.STYLE_SHEET)
+    view.resize(300, 900)
+    view.show()
+    app.processEvents()
+
+    start = time.perf_counter()
+    # populate_card_list no usa el estado de la ventana, así que se llama sin crear KanbanApp
+    kanban_app.KanbanApp.populate_card_list(None, view, cards)
+    view.repaint()
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    view.close()
+    return {'cards': len(cards), 'seconds': round(elapsed, 4)}
+
+
+def _startup_child(workdir, launched_at):
+    """Se ejecuta en un proceso aparte: arranca KanbanApp e informa del primer tablero pintado."""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    os.chdir(workdir)
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QApplication
+    import kanban_app
+
+    app = QApplication([])
+    original_display_board = kanban_app.KanbanApp.display_board
+
+    def display_board(window, board_data):
+        original_display_board(window, board_data)
+
+        def report():
+            print(json.dumps({'first_board_painted_seconds': round(time.time() - launched_at, 4)}), flush=True)
+            os._exit(0)
+
+        # Se espera a que el bucle de eventos procese el repintado
+        QTimer.singleShot(0, report)
+
+    kanban_app.KanbanApp.display_board = display_board
+    window = kanban_app.KanbanApp()
+    app.exec()
+
+
+def bench_startup(server, n_stacks, n_cards):
+    """Tiempo desde el lanzamiento del proceso hasta el primer tablero pintado, con caché caliente."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'kanban_data.db'))
+        db.save_credentials(server.url, 'bench', 'bench')
+        db.save_boards(server.boards())
+        db.save_stacks_and_cards(1, make_stacks(1, n_stacks, n_cards))
+        db.set_setting('last_board_id', '1')
+        db.close()
+        launched_at = time.time()
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--startup-child', tmp, str(launched_at)],
+            capture_output=True, text=True, timeout=120,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    for line in output.splitlines():
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"El proceso de arranque no informó del primer pintado:\n{output}")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(args):
+    selected = args.only or BENCHMARKS
+    results = {}
+    with FakeDeckServer(args.boards, args.stacks, args.cards, latency=args.latency,
+                        error_rate=args.error_rate) as server:
+        if 'api_fetch' in selected:
+            results['api_fetch'] = bench_api_fetch(server)
+        if 'offline_replay' in selected:
+            results['offline_replay'] = bench_offline_replay(server, args.changes)
+        if 'startup' in selected:
+            results['startup'] = bench_startup(server, args.stacks, args.cards)
+        server_stats = {'requests': server.request_count, 'injected_errors': server.error_count}
+    if 'save' in selected:
+        results['save_stacks_and_cards'] = bench_save_stacks_and_cards(args.boards, args.stacks, args.cards)
+    if 'render' in selected:
+        results['render'] = bench_render(args.render_cards)
+    if 'board_memory' in selected:
+        results['board_memory'] = bench_board_memory(args.stacks, args.cards)
+    if 'write_contention' in selected:
+        results['write_contention'] = bench_write_contention(8, args.changes)
+    if 'stream_memory' in selected:
+        results['stream_memory'] = bench_stream_memory(args.stacks, args.stream_cards, args.batch_size)
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {'boards': args.boards, 'stacks': args.stacks, 'cards': args.cards,
+                       'latency': args.latency, 'error_rate': args.error_rate, 'changes': args.changes,
+                       'render_cards': args.render_cards, 'stream_cards': args.stream_cards,
+                       'batch_size': args.batch_size},
+            'server': server_stats,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--boards', type=int, default=5)
+    parser.add_argument('--stacks', type=int, default=10)
+    parser.add_argument('--cards', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0, help="latencia simulada por petición (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fracción de peticiones que fallan con 503")
+    parser.add_argument('--changes', type=int, default=200, help="cambios en la cola offline a reenviar")
+    parser.add_argument('--render-cards', type=int, default=2000, help="tarjetas en la pila a pintar")
+    parser.add_argument('--stream-cards', type=int, default=2000,
+                        help="tarjetas por pila del tablero de stream_memory")
+    parser.add_argument('--batch-size', type=int, default=500, help="tamaño de lote de stream_memory")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help="ejecuta solo estos benchmarks")
+    parser.add_argument('--output', help="guarda los resultados en este archivo JSON")
+    parser.add_argument('--startup-child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup_child:
+        workdir, launched_at = args.startup_child
+        _startup_child(workdir, float(launched_at))
+        return
+
+    report = run_benchmarks(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
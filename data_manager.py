@@ -1,23 +1,122 @@
+import asyncio
+import threading
+import time
 import requests
 import json
-from deck_api_client import DeckAPIClient
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from deck_api_client import DeckAPIClient, AsyncDeckAPIClient, NOT_MODIFIED
 from database_manager import DatabaseManager
 
 
+class LRUTTLCache:
+    """
+    Caché en memoria acotada: como mucho max_entries entradas (se expulsa la menos usada)
+    y cada entrada caduca ttl segundos después de guardarse. Segura entre hilos.
+    """
+    _MISSING = object()
+
+    def __init__(self, max_entries=64, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # clave -> (caduca_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Aumenta con cada invalidación: evita guardar datos cargados antes de invalidar
+        self._generation = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is not self._MISSING and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not self._MISSING:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            generation = self._generation
+            value = loader()
+            with self._lock:
+                stale = generation != self._generation
+            if not stale:
+                self.put(key, value)
+        return value
+
+    def invalidate(self, predicate):
+        """Elimina las entradas cuya clave cumple predicate(clave)."""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
 class DataManager:
     """
     Actúa como un orquestador entre el cliente de la API y el gestor de la base de datos.
     Contiene la lógica de negocio para la sincronización y el modo offline.
     """
 
-    def __init__(self, db_path='kanban_data.db'):
+    def __init__(self, db_path='kanban_data.db', cache_entries=64, cache_ttl=60.0, stream_batch_size=500):
+        """stream_batch_size: pilas y tarjetas que se leen de la red y se escriben de cada vez."""
         self.db = DatabaseManager(db_path)
         self.api = None
+        self._async_api = None
+        self.stream_batch_size = stream_batch_size
+        # Claves: ('boards',), ('stacks', board_id), ('board', board_id)
+        self.cache = LRUTTLCache(cache_entries, cache_ttl)
+        # Impide reenviar (o compactar) la cola offline dos veces a la vez: se duplicarían peticiones
+        self._sync_lock = threading.Lock()
+        # Ids temporales ya confirmados por el servidor: {('cards' | 'stacks', id_temporal): id}
+        self._resolved_ids = {}
+        self._change_listeners = []
 
     def attempt_login(self, url, username, password):
-        """Intenta crear un cliente de API y conectar."""
+        """
+        Intenta crear un cliente de API y conectar. Las credenciales se verifican con la propia
+        petición de la lista de tableros, que queda guardada para el load_boards posterior.
+        """
         try:
-            self.api = DeckAPIClient(url, username, password)
+            self.api = DeckAPIClient(url, username, password, validator_store=self.db, verify=False)
+            previous = self.db.load_credentials()
+            if previous and (previous['url'], previous['username']) != (url, username):
+                # Los ETag guardados corresponden a otra cuenta: la caché no es válida para esta
+                self.db.clear_etags()
+            # Lo cacheado mientras no había conexión debe volver a pedirse al servidor
+            self.cache.clear()
+            self._sync_boards()
+            self.cache.put(('boards',), self.db.get_boards())
             self.db.save_credentials(url, username, password)
             return True
         except (requests.exceptions.RequestException, requests.exceptions.HTTPError):
@@ -27,25 +126,210 @@ class DataManager:
     def load_credentials(self):
         return self.db.load_credentials()
 
+    def get_last_board_id(self):
+        board_id = self.db.get_setting('last_board_id')
+        return int(board_id) if board_id else None
+
+    def set_last_board_id(self, board_id):
+        self.db.set_setting('last_board_id', str(board_id))
+
+    def get_cached_snapshot(self):
+        """
+        Datos para pintar la ventana al arrancar sin esperar a la red: los tableros y el
+        contenido del último tablero abierto, leídos solo de la base de datos local.
+        Devuelve (tableros, id_ultimo_tablero, (pilas, {stack_id: tarjetas}) o None).
+        """
+        boards = self.db.get_boards()
+        last_board_id = self.get_last_board_id()
+        if last_board_id is None or last_board_id not in {board['id'] for board in boards}:
+            return boards, None, None
+        return boards, last_board_id, self.db.get_board_contents(last_board_id)
+
+    def get_local_board(self, board_id):
+        """(pilas, {stack_id: tarjetas}) de un tablero leído solo de la caché local, sin sincronizar."""
+        return self.db.get_board_contents(board_id)
+
+    # --- Eventos de cambio ---
+    def add_change_listener(self, listener):
+        """
+        Registra listener(board_id, eventos), que se llama (desde el hilo que hizo el cambio)
+        cada vez que cambia el contenido de un tablero en la caché local. Cada evento es un dict
+        con 'type' y los datos de la fila:
+          card_added / card_updated: 'card' (y 'previous_id' si cambió un id temporal)
+          card_moved: 'card', ya con su nueva pila
+          card_removed: 'card_id'
+          stack_added / stack_updated: 'stack' (y 'previous_id')
+          stack_removed: 'stack_id'
+        """
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        self._change_listeners.remove(listener)
+
+    def _notify(self, board_id, events):
+        if not events:
+            return
+        for listener in list(self._change_listeners):
+            listener(board_id, events)
+
+    def _notify_sync_changes(self, board_id, changes):
+        """Convierte el resultado de save_stacks_and_cards en eventos de cambio."""
+        if not self._change_listeners:
+            return
+        stack_changes, card_changes = changes['stacks'], changes['cards']
+        events = [{'type': 'stack_removed', 'stack_id': stack_id} for stack_id in stack_changes['removed']]
+        events += [{'type': 'card_removed', 'card_id': card_id} for card_id in card_changes['removed']]
+        added = set(stack_changes['added'])
+        for stack in self.db.get_stacks_by_ids(stack_changes['added'] + stack_changes['updated']):
+            events.append({'type': 'stack_added' if stack['id'] in added else 'stack_updated', 'stack': stack})
+        added, moved = set(card_changes['added']), set(card_changes.get('moved', ()))
+        for card in self.db.get_cards_by_ids(card_changes['added'] + card_changes['updated']):
+            if card['id'] in added:
+                events.append({'type': 'card_added', 'card': card})
+            elif card['id'] in moved:
+                events.append({'type': 'card_moved', 'card': card})
+            else:
+                events.append({'type': 'card_updated', 'card': card})
+        self._notify(board_id, events)
+
+    def invalidate_board(self, board_id):
+        """Descarta de la caché en memoria todo lo que depende de un tablero."""
+        self.cache.invalidate(lambda key: key[0] in ('stacks', 'board') and key[1] == board_id)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def close(self):
+        """Libera los recursos (hilos y conexiones a la base de datos) al cerrar la aplicación."""
+        if self._async_api is not None:
+            self._async_api.close()
+            self._async_api = None
+        self.db.close()
+
     def is_online(self):
-        return self.api is not None
+        """
+        Conectado si hay cliente de API y su circuit breaker no está abierto. Tras el tiempo de
+        espera del circuito se vuelve a considerar online y la siguiente petición sirve de prueba.
+        """
+        return self.api is not None and self.api.circuit_breaker.is_available()
 
-    def sync_offline_changes(self):
+    def compact_offline_changes(self):
+        """
+        Reduce la cola offline antes de reenviarla: los PUT sucesivos al mismo endpoint se
+        fusionan en uno solo (gana el último valor de cada campo) y se descartan los cambios
+        que un DELETE posterior del mismo endpoint deja sin efecto.
+        Devuelve el número de peticiones ahorradas (0 si hay una sincronización en curso).
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._compact_offline_changes()
+        finally:
+            self._sync_lock.release()
+
+    def _compact_offline_changes(self):
+        changes = self.db.get_offline_changes()
+        kept_puts = {}  # endpoint -> id del último PUT, que acumula los campos de los anteriores
+        deleted_later = set()
+        merged_payloads = {}
+        dropped = []
+        # Se recorre del más reciente al más antiguo: lo posterior siempre tiene prioridad
+        for change in reversed(changes):
+            method, endpoint = change['method'], change['endpoint']
+            if method == 'DELETE':
+                deleted_later.add(endpoint)
+            elif method == 'PUT':
+                payload = json.loads(change['payload']) if change['payload'] else None
+                if endpoint in deleted_later:
+                    dropped.append(change['id'])
+                elif endpoint in kept_puts:
+                    kept_id = kept_puts[endpoint]
+                    merged_payloads[kept_id] = {**(payload or {}), **merged_payloads[kept_id]}
+                    dropped.append(change['id'])
+                else:
+                    kept_puts[endpoint] = change['id']
+                    merged_payloads[change['id']] = payload or {}
+
+        if dropped:
+            kept_ids = set(kept_puts.values())
+            self.db.rewrite_offline_changes({k: v for k, v in merged_payloads.items() if k in kept_ids}, dropped)
+            print(f"Cola offline compactada: {len(dropped)} peticiones redundantes eliminadas")
+        return len(dropped)
+
+    @staticmethod
+    def _replay_chain_key(endpoint):
+        """
+        Cadena de dependencia de un cambio: los cambios de un mismo tablero se reenvían en orden,
+        mientras que los de tableros distintos son independientes entre sí.
+        """
+        parts = endpoint.strip('/').split('/')
+        if parts[0] == 'boards' and len(parts) > 1:
+            return f"boards/{parts[1]}"
+        return parts[0]
+
+    def sync_offline_changes(self, max_workers=4, progress_callback=None):
+        """
+        Reenvía la cola offline. Los cambios se agrupan en cadenas por tablero: cada cadena
+        se reenvía en orden y las distintas cadenas en paralelo (hasta max_workers).
+        Un fallo solo detiene su propia cadena; sus cambios pendientes quedan en la cola.
+        progress_callback(hechos, total) se llama tras cada cambio sincronizado.
+        Si ya hay otra sincronización en curso no se hace nada y se devuelve 0.
+        """
         if not self.is_online():
             return 0
+        if not self._sync_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._sync_offline_changes(max_workers, progress_callback)
+        finally:
+            self._sync_lock.release()
 
+    def _sync_offline_changes(self, max_workers, progress_callback):
         changes = self.db.get_offline_changes()
-        synced_count = 0
+        chains = {}
         for change in changes:
+            chains.setdefault(self._replay_chain_key(change['endpoint']), []).append(change)
+
+        total = len(changes)
+        done = 0
+        lock = threading.Lock()
+
+        def on_synced():
+            nonlocal done
+            with lock:
+                done += 1
+                current = done
+            if progress_callback:
+                progress_callback(current, total)
+
+        if not chains:
+            return 0
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chains)))) as executor:
+            synced_count = sum(executor.map(lambda chain: self._replay_chain(chain, on_synced), chains.values()))
+        if synced_count:
+            self.cache.clear()
+        return synced_count
+
+    def _replay_chain(self, chain, on_synced):
+        synced_count = 0
+        for position, change in enumerate(chain):
             try:
                 print(f"Sincronizando: {change['method']} {change['endpoint']}")
-                self.api._api_request(
+                result = self.api._api_request(
                     change['method'],
                     change['endpoint'],
                     json.loads(change['payload']) if change['payload'] else None
                 )
                 self.db.delete_offline_change(change['id'])
+                if change.get('local_id') is not None and isinstance(result, dict) and result.get('id') is not None:
+                    kind = change['endpoint'].rstrip('/').rsplit('/', 1)[-1]
+                    self._resolve_local_id(kind, change['local_id'], result['id'])
+                    # Los cambios siguientes de la cadena ya se leyeron con el id temporal
+                    for pending in chain[position + 1:]:
+                        pending['endpoint'] = self.db.replace_endpoint_id(
+                            pending['endpoint'], kind, change['local_id'], result['id'])
                 synced_count += 1
+                on_synced()
             except requests.exceptions.RequestException as e:
                 print(f"Error al sincronizar cambio {change['id']}: {e}")
                 break
@@ -53,71 +337,213 @@ class DataManager:
 
     # --- Métodos de Datos con Lógica de Sincronización ---
     def get_boards(self):
+        return self.cache.get_or_load(('boards',), self._load_boards)
+
+    def _load_boards(self):
         if self.is_online():
             try:
-                boards_from_api = self.api.get_boards()
-                self.db.save_boards(boards_from_api)
+                self._sync_boards()
             except requests.exceptions.RequestException as e:
                 print(f"No se pudo sincronizar tableros: {e}")
         return self.db.get_boards()
 
-    def get_stacks(self, board_id):
+    def _sync_boards(self):
+        """
+        Guarda la lista de tableros del servidor si ha cambiado (petición condicional).
+        Devuelve False si el servidor ha respondido que no ha cambiado.
+        """
+        response = self.api.get_boards(save_etag=False)
+        if response is NOT_MODIFIED:
+            return False
+        boards_from_api, etag = response
+        self.db.save_boards(boards_from_api)
+        # El ETag se guarda después que los tableros: si el guardado falla, se vuelven a pedir
+        if etag:
+            self.db.save_etag('boards', etag)
+        return True
+
+    def _fetch_and_save_board(self, board_id):
+        """
+        Descarga las pilas y tarjetas de un tablero y las guarda por lotes mientras se leen.
+        Devuelve los cambios, o None si el servidor responde que no ha cambiado.
+        """
+        stream = self.api.get_stacks_with_cards_stream(board_id, self.stream_batch_size)
+        if stream is NOT_MODIFIED:
+            return None
+        with stream:
+            changes = self.db.save_stacks_and_cards_stream(board_id, stream)
+            # Solo ahora el tablero local corresponde al ETag recibido
+            stream.save_etag()
+        return changes
+
+    def _sync_board(self, board_id):
         if self.is_online():
             try:
-                stacks_from_api = self.api.get_stacks_with_cards(board_id)
-                self.db.save_stacks_and_cards(board_id, stacks_from_api)
+                changes = self._fetch_and_save_board(board_id)
+                if changes and any(ids for table in changes.values() for ids in table.values()):
+                    self.invalidate_board(board_id)
+                    self._notify_sync_changes(board_id, changes)
             except requests.exceptions.RequestException as e:
                 print(f"No se pudo sincronizar pilas/tarjetas: {e}")
-        return self.db.get_stacks(board_id)
 
-    def get_cards(self, board_id, stack_id):
-        return self.db.get_cards(stack_id)
+    def get_stacks(self, board_id):
+        def load():
+            self._sync_board(board_id)
+            return self.db.get_stacks(board_id)
+
+        return self.cache.get_or_load(('stacks', board_id), load)
+
+    def get_board(self, board_id):
+        """Sincroniza un tablero y devuelve (pilas, {stack_id: tarjetas}) de una sola vez."""
+        def load():
+            self._sync_board(board_id)
+            return self.db.get_board_contents(board_id)
+
+        return self.cache.get_or_load(('board', board_id), load)
+
+    def refresh_all_boards(self, max_concurrency=8):
+        """
+        Descarga en paralelo las pilas y tarjetas de todos los tableros y actualiza la caché.
+        Devuelve {board_id: cambios} para los tableros que se han podido sincronizar.
+        """
+        if not self.is_online():
+            return {}
+        # Se reutiliza el cliente asíncrono (y su pool de conexiones) mientras no cambie la sesión
+        if (self._async_api is None or self._async_api.client is not self.api
+                or self._async_api.max_concurrency != max_concurrency):
+            if self._async_api is not None:
+                self._async_api.close()
+            self._async_api = AsyncDeckAPIClient(self.api, max_concurrency)
+        return asyncio.run(self._refresh_all_boards(self._async_api))
+
+    async def _refresh_all_boards(self, async_api):
+        try:
+            if await async_api.run(self._sync_boards):
+                self.cache.invalidate(lambda key: key == ('boards',))
+        except requests.exceptions.RequestException as e:
+            print(f"No se pudo sincronizar tableros: {e}")
+        board_ids = [board['id'] for board in self.db.get_boards()]
+
+        # Cada tablero se lee y se guarda por lotes en su hilo a medida que llega: las
+        # transacciones son cortas (una por lote) y no hace falta tener todas las respuestas en memoria
+        results = await asyncio.gather(*(async_api.run(self._fetch_and_save_board, board_id)
+                                         for board_id in board_ids), return_exceptions=True)
+        changes = {}
+        for board_id, board_changes in zip(board_ids, results):
+            if isinstance(board_changes, requests.exceptions.RequestException):
+                print(f"No se pudo sincronizar pilas/tarjetas del tablero {board_id}: {board_changes}")
+            elif isinstance(board_changes, BaseException):
+                raise board_changes
+            elif board_changes is not None:
+                changes[board_id] = board_changes
+                self.invalidate_board(board_id)
+                self._notify_sync_changes(board_id, board_changes)
+        return changes
+
+    def get_card_detail(self, card_id):
+        """
+        La tarjeta completa (con descripción) para editarla. Las listas solo cargan las columnas
+        que muestran; la descripción se pide aquí, al abrir la tarjeta, y no se cachea.
+        """
+        return self.db.get_card_detail(self._current_id('cards', card_id))
+
+    def get_labels(self, board_id=None):
+        return self.db.get_labels(board_id)
+
+    def get_cards_with_label(self, title, board_id=None):
+        """Tarjetas con la etiqueta indicada; board_id=None busca en todos los tableros."""
+        return self.db.get_cards_with_label(title, board_id)
+
+    def get_overdue_cards(self, limit=50, after=None):
+        """Tarjetas vencidas de todos los tableros, de la más antigua a la más reciente."""
+        return self.db.get_cards_due(end=int(time.time()), limit=limit, after=after)
+
+    def get_cards_due_within(self, days, limit=50, after=None):
+        """Tarjetas de todos los tableros que vencen en los próximos days días."""
+        now = int(time.time())
+        return self.db.get_cards_due(start=now, end=now + days * 86400, limit=limit, after=after)
+
+    def search_cards(self, query, board_id=None, limit=50):
+        """Busca tarjetas en la caché local; board_id=None busca en todos los tableros."""
+        return self.db.search_cards(query, board_id, limit)
 
     # --- Métodos de Creación/Actualización ---
-    def _execute_or_queue(self, method, endpoint, payload):
-        if self.is_online():
+    def _execute_or_queue(self, method, endpoint, payload, local_id=None):
+        # Un endpoint con ids temporales no existe aún en el servidor: se encola detrás de su creación
+        if self.is_online() and not re.search(r"/-\d+(?=/|$)", endpoint):
             try:
                 return self.api._api_request(method, endpoint, payload)
             except requests.exceptions.RequestException as e:
                 print(
                     f"La acción API falló. Revisa los 'DETALLES DEL ERROR HTTP' impresos arriba. El cambio se encolará para reintentar más tarde. Error: {e}")
-                self.db.queue_offline_change(method, endpoint, payload)
+                self.db.queue_offline_change(method, endpoint, payload, local_id)
                 return None
         else:
-            self.db.queue_offline_change(method, endpoint, payload)
+            self.db.queue_offline_change(method, endpoint, payload, local_id)
             return None
 
+    def _resolve_local_id(self, kind, temp_id, real_id):
+        """Sustituye en la caché local un id temporal por el que ha asignado el servidor."""
+        self._resolved_ids[(kind, temp_id)] = real_id
+        if kind == 'stacks':
+            stack = self.db.resolve_local_stack(temp_id, real_id)
+            if stack:
+                self.invalidate_board(stack['board_id'])
+                self._notify(stack['board_id'], [{'type': 'stack_updated', 'stack': stack, 'previous_id': temp_id}])
+            return stack
+        if kind == 'cards':
+            card = self.db.resolve_local_card(temp_id, real_id)
+            if card:
+                self.invalidate_board(card['board_id'])
+                self._notify(card['board_id'], [{'type': 'card_updated', 'card': card, 'previous_id': temp_id}])
+            return card
+        return None
+
+    def _current_id(self, kind, item_id):
+        return self._resolved_ids.get((kind, item_id), item_id)
+
     def create_board(self, title, color):
-        return self._execute_or_queue('POST', 'boards', {'title': title, 'color': color})
+        result = self._execute_or_queue('POST', 'boards', {'title': title, 'color': color})
+        self.cache.invalidate(lambda key: key == ('boards',))
+        return result
 
     def create_stack(self, board_id, title):
-        # --- CAMBIO ---
-        # Calcular el nuevo 'order' para la pila
-        stacks = self.db.get_stacks(board_id)
-        if stacks:
-            # Encuentra el 'order' máximo y le suma 1. Usa 0 como default si una pila no tuviera 'order'.
-            max_order = max(s.get('order', 0) for s in stacks if s.get('order') is not None) if any(
-                s.get('order') is not None for s in stacks) else 0
-            new_order = max_order + 1
-        else:
-            new_order = 1
-
-        payload = {'title': title, 'order': new_order}
-        return self._execute_or_queue('POST', f'boards/{board_id}/stacks', payload)
+        """
+        Crea la pila primero en la caché local, con un id temporal, y lo notifica (stack_added)
+        para que la interfaz la muestre sin esperar a la red. Devuelve la pila con el id del
+        servidor si la API responde, o la temporal si el cambio queda encolado.
+        """
+        stack = self.db.insert_local_stack(board_id, title)
+        self.invalidate_board(board_id)
+        self._notify(board_id, [{'type': 'stack_added', 'stack': stack}])
+        payload = {'title': title, 'order': stack['order']}
+        result = self._execute_or_queue('POST', f'boards/{board_id}/stacks', payload, local_id=stack['id'])
+        if result and result.get('id') is not None:
+            stack = self._resolve_local_id('stacks', stack['id'], result['id']) or stack
+        return stack
 
     def create_card(self, board_id, stack_id, title):
-        # Calcular el nuevo 'order' para la tarjeta
-        cards = self.db.get_cards(stack_id)
-        if cards:
-            max_order = max(c.get('order', 0) for c in cards if c.get('order') is not None) if any(
-                c.get('order') is not None for c in cards) else 0
-            new_order = max_order + 1
-        else:
-            new_order = 1
-
-        payload = {'title': title, 'order': new_order}
-        return self._execute_or_queue('POST', f'boards/{board_id}/stacks/{stack_id}/cards', payload)
+        """Igual que create_stack, para una tarjeta al final de su pila (card_added)."""
+        stack_id = self._current_id('stacks', stack_id)
+        card = self.db.insert_local_card(board_id, stack_id, title)
+        self.invalidate_board(board_id)
+        self._notify(board_id, [{'type': 'card_added', 'card': card}])
+        payload = {'title': title, 'order': card['order']}
+        result = self._execute_or_queue('POST', f'boards/{board_id}/stacks/{stack_id}/cards', payload,
+                                        local_id=card['id'])
+        if result and result.get('id') is not None:
+            card = self._resolve_local_id('cards', card['id'], result['id']) or card
+        return card
 
     def update_card(self, board_id, stack_id, card_id, **kwargs):
+        """
+        Aplica la edición primero en la caché local (y en el índice de búsqueda), lo notifica
+        (card_updated) y después la envía a la API o la encola.
+        """
+        stack_id, card_id = self._current_id('stacks', stack_id), self._current_id('cards', card_id)
+        self.db.update_card_fields(card_id, **kwargs)
+        self.invalidate_board(board_id)
+        card = self.db.get_card(card_id)
+        if card:
+            self._notify(board_id, [{'type': 'card_updated', 'card': card}])
         return self._execute_or_queue('PUT', f'boards/{board_id}/stacks/{stack_id}/cards/{card_id}', kwargs)
-
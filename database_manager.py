@@ -1,27 +1,339 @@
 import sqlite3
 import json
 import base64
+import functools
+import hashlib
+import itertools
+import queue
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from metrics import metrics
+
+# Convierte una fecha ISO 8601 (con zona horaria) en segundos desde epoch UTC, o NULL si no es válida
+DUE_EPOCH_SQL = "CAST(strftime('%s', {}) AS INTEGER)"
+
+# Columnas que necesita la lista de tarjetas: sin la descripción, que solo se lee al editar
+# una tarjeta (get_card_detail), para que la memoria no crezca con el texto de las descripciones
+CARD_LIST_COLUMNS = ('id', 'stack_id', 'board_id', 'title', 'duedate', 'due_at', 'labels_json', '"order"')
+
+
+def _card_columns(alias=None):
+    return ", ".join(f"{alias}.{column}" if alias else column for column in CARD_LIST_COLUMNS)
+
+
+_IN_PLACEHOLDERS = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=256)
+def _statement_label(query):
+    """
+    Etiqueta de métricas de una consulta: sin saltos de línea y con las listas IN (?, ?, …) de
+    longitud variable reducidas a IN (…), para que cada tamaño de lote no cree una serie nueva.
+    """
+    return _IN_PLACEHOLDERS.sub("IN (…)", " ".join(query.split()))
+
+
+class DatabaseWriter:
+    """
+    Hilo único que ejecuta todas las escrituras de un DatabaseManager con su propia conexión.
+    Las operaciones llegan por una cola y devuelven un Future. Mientras haya más operaciones
+    esperando se agrupan en la misma transacción (hasta max_batch_size operaciones o
+    max_batch_seconds), así que los hilos que escriben a la vez comparten un solo commit en
+    lugar de competir por el bloqueo de SQLite. Cada operación va en su propio SAVEPOINT:
+    si falla, solo se deshace ella y su Future recibe la excepción. Si el hilo termina por un
+    error inesperado, las operaciones pendientes y las que lleguen después fallan con ese error.
+    """
+    _STOP = object()
+
+    def __init__(self, db, max_batch_size=100, max_batch_seconds=0.05):
+        """Lanza el error de sqlite3 si no se puede abrir la conexión de escritura."""
+        self.db = db
+        self.max_batch_size = max_batch_size
+        self.max_batch_seconds = max_batch_seconds
+        self._queue = queue.SimpleQueue()
+        self._stopping = False
+        self._error = None
+        self._error_lock = threading.Lock()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='DatabaseWriter', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            raise self._error
+
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def is_alive(self):
+        return self._error is None and self._thread.is_alive()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        with self._error_lock:
+            if self._error is None:
+                self._queue.put((future, fn, args, kwargs, time.perf_counter()))
+                return future
+        future.set_exception(RuntimeError(f"El hilo escritor de la base de datos ha terminado: {self._error!r}"))
+        return future
+
+    def stop(self):
+        """Termina el hilo después de ejecutar las operaciones ya encoladas."""
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        try:
+            conn = self.db._get_connection(read_only=False)
+        except BaseException as e:
+            self._error = e
+            self._started.set()
+            return
+        self._started.set()
+        try:
+            while not self._stopping:
+                item = self._queue.get()
+                if item is self._STOP:
+                    break
+                self._run_batch(conn, item)
+        except BaseException as e:
+            # Nadie más va a leer la cola: se hacen fallar las operaciones pendientes
+            with self._error_lock:
+                self._error = e
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not self._STOP:
+                    item[0].set_exception(e)
+            raise
+
+    def _run_batch(self, conn, item):
+        done = []
+        start = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Las transacciones de las operaciones se integran en la del lote (ver _transaction)
+            self.db._local.tx_depth = 1
+            while item is not None:
+                done.append(self._run_operation(conn, item))
+                item = None
+                if len(done) < self.max_batch_size and time.perf_counter() - start < self.max_batch_seconds:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        pass
+                    if item is self._STOP:
+                        self._stopping = True
+                        item = None
+            conn.commit()
+        except BaseException as e:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                pass
+            # Sin commit no se ha guardado nada del lote: fallan todas sus operaciones
+            futures = [future for future, _, _ in done] + ([item[0]] if item is not None else [])
+            for future in futures:
+                future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            done = []
+        finally:
+            self.db._local.tx_depth = 0
+        if metrics.enabled:
+            metrics.increment('db_write_batches')
+            metrics.increment('db_write_operations', len(done))
+            metrics.observe('db_write_batch_seconds', time.perf_counter() - start)
+        for future, result, error in done:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _run_operation(conn, item):
+        future, fn, args, kwargs, queued_at = item
+        if metrics.enabled:
+            metrics.observe('db_write_queue_seconds', time.perf_counter() - queued_at)
+        conn.execute("SAVEPOINT write_operation")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            conn.execute("ROLLBACK TO write_operation")
+            conn.execute("RELEASE write_operation")
+            return future, None, e
+        conn.execute("RELEASE write_operation")
+        return future, result, None
+
+
+class _ThreadConnection:
+    """Conexión asignada a un hilo; al desaparecer (termina el hilo) se devuelve al gestor."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+def _writes(method):
+    """Los métodos que modifican la base de datos se ejecutan en el hilo escritor."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self._write(method, self, *args, **kwargs)
+
+    return wrapper
 
 
 class DatabaseManager:
     """
     Gestiona todas las operaciones de la base de datos local (SQLite).
-    Es seguro para usar en múltiples hilos.
+    Es seguro para usar en múltiples hilos: las lecturas usan una conexión de solo lectura
+    por hilo y todas las escrituras pasan por un único hilo escritor (DatabaseWriter).
     """
+    # Conexiones de lectura libres que se guardan para los siguientes hilos; el resto se cierra
+    MAX_IDLE_CONNECTIONS = 4
 
     def __init__(self, db_path='kanban_data.db'):
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._idle_connections = []
+        self._connections_lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        # Identificador de cada lectura por lotes en curso (save_stacks_and_cards_stream)
+        self._stream_ids = itertools.count(1)
         self._create_tables()
 
-    def _execute(self, query, params=(), commit=False, fetchone=False, fetchall=False):
+    def _get_connection(self, read_only=True):
         """
-        Ejecuta consultas SQL, creando una conexión nueva en cada llamada
-        para ser seguro en entornos multihilo.
+        Devuelve la conexión del hilo actual, creándola la primera vez.
+        Cada hilo (p. ej. los workers del QThreadPool) reutiliza una única
+        conexión de larga duración en lugar de abrir una por consulta.
+        Solo la conexión del hilo escritor puede modificar la base de datos.
+        Cuando el hilo termina, su conexión de lectura vuelve a una reserva de como mucho
+        MAX_IDLE_CONNECTIONS para el siguiente hilo, y las demás se cierran: los hilos de los
+        ejecutores de asyncio y del QThreadPool se renuevan y no deben acumular conexiones.
         """
-        conn = sqlite3.connect(self.db_path)
+        thread_conn = getattr(self._local, 'conn', None)
+        if thread_conn is None:
+            conn = None
+            if read_only:
+                with self._connections_lock:
+                    if self._idle_connections:
+                        conn = self._idle_connections.pop()
+            if conn is None:
+                conn = self._connect(read_only)
+            thread_conn = self._local.conn = _ThreadConnection(conn)
+            weakref.finalize(thread_conn, self._release_connection, conn, read_only)
+        return thread_conn.conn
+
+    def _connect(self, read_only):
+        # check_same_thread=False para poder cerrarla desde close() y pasarla de un hilo a otro;
+        # en cada momento la usa un único hilo.
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        # WAL permite que los lectores no bloqueen al escritor
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _release_connection(self, conn, read_only):
+        """Se llama al terminar el hilo que usaba la conexión."""
+        with self._connections_lock:
+            if conn not in self._connections:
+                return  # ya cerrada por close()
+            if read_only and not conn.in_transaction and len(self._idle_connections) < self.MAX_IDLE_CONNECTIONS:
+                self._idle_connections.append(conn)
+                return
+            self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _get_writer(self):
+        with self._writer_lock:
+            # Si el hilo anterior terminó por un error, se intenta con uno nuevo
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = DatabaseWriter(self)
+            return self._writer
+
+    def submit_write(self, fn, *args, **kwargs):
+        """
+        Encola fn(*args, **kwargs) en el hilo escritor y devuelve un concurrent.futures.Future
+        con su resultado. fn se ejecuta dentro de la transacción del lote.
+        """
+        return self._get_writer().submit(fn, *args, **kwargs)
+
+    def _write(self, fn, *args, **kwargs):
+        """Ejecuta una escritura en el hilo escritor y espera a que se haya confirmado."""
+        writer = self._get_writer()
+        if writer.in_writer_thread():
+            return fn(*args, **kwargs)
+        return writer.submit(fn, *args, **kwargs).result()
+
+    def close(self):
+        """Termina el hilo escritor y cierra todas las conexiones abiertas por cualquier hilo."""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.stop()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._idle_connections = []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    @contextmanager
+    def _transaction(self, immediate=False):
+        """
+        Agrupa varias escrituras en una única transacción de la conexión del hilo.
+        Si algo falla se hace rollback, de modo que la caché nunca queda a medias.
+        Las transacciones anidadas se integran en la más externa.
+        Con immediate=True el bloqueo de escritura se toma al empezar, no en la primera escritura.
+        """
+        conn = self._get_connection()
+        depth = getattr(self._local, 'tx_depth', 0)
+        if depth == 0 and not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        self._local.tx_depth = depth + 1
+        start = time.perf_counter() if metrics.enabled and depth == 0 else None
+        try:
+            yield conn
+        except BaseException:
+            self._local.tx_depth = depth
+            if depth == 0:
+                conn.rollback()
+            raise
+        else:
+            self._local.tx_depth = depth
+            if depth == 0:
+                conn.commit()
+            if start is not None:
+                metrics.observe('db_transaction_seconds', time.perf_counter() - start)
+
+    def _execute(self, query, params=(), commit=False, fetchone=False, fetchall=False):
+        """
+        Ejecuta consultas SQL usando la conexión persistente del hilo actual.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        start = time.perf_counter() if metrics.enabled else None
         try:
-            cursor = conn.cursor()
             cursor.execute(query, params)
             result = None
             if fetchone:
@@ -30,28 +342,143 @@ class DatabaseManager:
                 result = dict(row) if row else None
             if fetchall:
                 result = [dict(row) for row in cursor.fetchall()]
-            if commit:
+            if commit and not getattr(self._local, 'tx_depth', 0):
                 conn.commit()
             return result
+        except sqlite3.Error:
+            if conn.in_transaction and not getattr(self._local, 'tx_depth', 0):
+                conn.rollback()
+            raise
         finally:
-            conn.close()
+            cursor.close()
+            if start is not None:
+                metrics.observe('db_execute_seconds', time.perf_counter() - start, statement=_statement_label(query))
 
+    @_writes
     def _create_tables(self):
-        self._execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)", commit=True)
-        self._execute("CREATE TABLE IF NOT EXISTS boards (id INTEGER PRIMARY KEY, title TEXT NOT NULL, color TEXT)",
-                      commit=True)
+        """
+        Crea o actualiza el esquema aplicando en orden las migraciones pendientes.
+        La versión aplicada se guarda en PRAGMA user_version; cada migración corre en la misma
+        transacción que el cambio de versión, así que una actualización fallida no deja el
+        archivo a medias. Las bases de datos anteriores al versionado tienen versión 0 y, como
+        las primeras migraciones son idempotentes, se actualizan sin perder datos.
+        """
+        with self._transaction(immediate=True) as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > len(self.MIGRATIONS):
+                raise RuntimeError(f"La base de datos {self.db_path} tiene el esquema v{version}, "
+                                   f"más reciente que el soportado (v{len(self.MIGRATIONS)})")
+            for target_version, migration in enumerate(self.MIGRATIONS[version:], start=version + 1):
+                migration(self)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+
+    # --- Migraciones (no se deben modificar una vez publicadas; los cambios van en una nueva) ---
+    def _migration_base_tables(self):
+        self._execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self._execute("CREATE TABLE IF NOT EXISTS boards (id INTEGER PRIMARY KEY, title TEXT NOT NULL, color TEXT)")
         # --- CAMBIO --- Se añade la columna "order" a la tabla de stacks
         self._execute(
-            "CREATE TABLE IF NOT EXISTS stacks (id INTEGER PRIMARY KEY, board_id INTEGER NOT NULL, title TEXT NOT NULL, \"order\" INTEGER, FOREIGN KEY (board_id) REFERENCES boards (id) ON DELETE CASCADE)",
-            commit=True)
+            "CREATE TABLE IF NOT EXISTS stacks (id INTEGER PRIMARY KEY, board_id INTEGER NOT NULL, title TEXT NOT NULL, \"order\" INTEGER, FOREIGN KEY (board_id) REFERENCES boards (id) ON DELETE CASCADE)")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS cards (id INTEGER PRIMARY KEY, stack_id INTEGER NOT NULL, board_id INTEGER NOT NULL, title TEXT NOT NULL, description TEXT, duedate TEXT, labels_json TEXT)")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS offline_changes (id INTEGER PRIMARY KEY AUTOINCREMENT, method TEXT NOT NULL, endpoint TEXT NOT NULL, payload TEXT)")
+
+    def _migration_content_hashes(self):
+        self._ensure_column('stacks', 'content_hash', 'TEXT')
+        self._ensure_column('cards', 'content_hash', 'TEXT')
+
+    def _migration_http_etags(self):
+        self._execute("CREATE TABLE IF NOT EXISTS http_etags (endpoint TEXT PRIMARY KEY, etag TEXT NOT NULL)")
+
+    def _migration_search_index(self):
+        """
+        Índice FTS5 sobre el título y la descripción de las tarjetas. Es una tabla de contenido
+        externo sobre cards que se mantiene sincronizada mediante triggers.
+        """
+        exists = self._execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cards_fts'",
+                               fetchone=True)
+        self._execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5(title, description, content='cards', "
+            "content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+        self._execute(
+            "CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN "
+            "INSERT INTO cards_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END")
         self._execute(
-            "CREATE TABLE IF NOT EXISTS cards (id INTEGER PRIMARY KEY, stack_id INTEGER NOT NULL, board_id INTEGER NOT NULL, title TEXT NOT NULL, description TEXT, duedate TEXT, labels_json TEXT)",
-            commit=True)
+            "CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN "
+            "INSERT INTO cards_fts (cards_fts, rowid, title, description) "
+            "VALUES ('delete', old.id, old.title, old.description); END")
         self._execute(
-            "CREATE TABLE IF NOT EXISTS offline_changes (id INTEGER PRIMARY KEY AUTOINCREMENT, method TEXT NOT NULL, endpoint TEXT NOT NULL, payload TEXT)",
-            commit=True)
+            "CREATE TRIGGER IF NOT EXISTS cards_fts_update AFTER UPDATE OF title, description ON cards BEGIN "
+            "INSERT INTO cards_fts (cards_fts, rowid, title, description) "
+            "VALUES ('delete', old.id, old.title, old.description); "
+            "INSERT INTO cards_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END")
+        if not exists:
+            # Bases de datos anteriores al índice: se indexan las tarjetas ya guardadas
+            self._execute("INSERT INTO cards_fts (cards_fts) VALUES ('rebuild')")
+
+    def _migration_lookup_indexes(self):
+        # Índices para get_cards, get_stacks, get_board_contents y los borrados por tablero
+        self._execute("CREATE INDEX IF NOT EXISTS idx_cards_stack_id ON cards (stack_id)")
+        self._execute("CREATE INDEX IF NOT EXISTS idx_cards_board_id ON cards (board_id)")
+        self._execute("CREATE INDEX IF NOT EXISTS idx_stacks_board_id ON stacks (board_id, \"order\")")
+
+    def _migration_labels(self):
+        """Etiquetas normalizadas, para filtrar tarjetas por etiqueta con índices."""
+        self._execute("CREATE TABLE IF NOT EXISTS labels (id INTEGER PRIMARY KEY, board_id INTEGER NOT NULL, "
+                      "title TEXT NOT NULL, color TEXT)")
+        self._execute("CREATE TABLE IF NOT EXISTS card_labels (card_id INTEGER NOT NULL, label_id INTEGER NOT NULL, "
+                      "PRIMARY KEY (card_id, label_id)) WITHOUT ROWID")
+        self._execute("CREATE INDEX IF NOT EXISTS idx_card_labels_label_id ON card_labels (label_id)")
+        self._execute("CREATE INDEX IF NOT EXISTS idx_labels_title ON labels (title COLLATE NOCASE)")
+        # Se rellenan a partir de las etiquetas ya guardadas en labels_json
+        rows = self._execute("SELECT id, board_id, labels_json FROM cards WHERE labels_json IS NOT NULL",
+                             fetchall=True)
+        labels_by_board = {}
+        for row in rows:
+            labels_by_board.setdefault(row['board_id'], {})[row['id']] = json.loads(row['labels_json'])
+        conn = self._get_connection()
+        for board_id, labels_by_card in labels_by_board.items():
+            self._replace_card_labels(conn, board_id, labels_by_card, [])
+
+    def _migration_due_epoch(self):
+        """Fecha límite precalculada en segundos UTC e indexada, para las consultas de vencimientos."""
+        self._ensure_column('cards', 'due_at', 'INTEGER')
+        self._execute(f"UPDATE cards SET due_at = {DUE_EPOCH_SQL.format('duedate')} WHERE duedate IS NOT NULL")
+        self._execute("CREATE INDEX IF NOT EXISTS idx_cards_due_at ON cards (due_at) WHERE due_at IS NOT NULL")
+
+    def _migration_card_order(self):
+        """Orden de las tarjetas dentro de su pila e id local de los cambios offline que crean filas."""
+        self._ensure_column('cards', '"order"', 'INTEGER')
+        self._ensure_column('offline_changes', 'local_id', 'INTEGER')
+        # (stack_id, "order") sirve también para las búsquedas por stack_id, y MAX("order") es inmediato
+        self._execute("CREATE INDEX IF NOT EXISTS idx_cards_stack_order ON cards (stack_id, \"order\")")
+        self._execute("DROP INDEX IF EXISTS idx_cards_stack_id")
+
+    MIGRATIONS = [
+        _migration_base_tables,
+        _migration_content_hashes,
+        _migration_http_etags,
+        _migration_search_index,
+        _migration_lookup_indexes,
+        _migration_labels,
+        _migration_due_epoch,
+        _migration_card_order,
+    ]
+
+    def _ensure_column(self, table, column, declaration):
+        """Añade una columna a una tabla existente si todavía no la tiene."""
+        columns = self._execute(f"PRAGMA table_info({table})", fetchall=True)
+        if column.strip('"') not in {c['name'] for c in columns}:
+            self._execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}", commit=True)
+
+    @staticmethod
+    def _row_hash(row):
+        """Huella del contenido de una fila, para detectar si ha cambiado respecto a la caché."""
+        return hashlib.sha1(json.dumps(row).encode()).hexdigest()
 
     # --- Credenciales ---
+    @_writes
     def save_credentials(self, url, username, password):
         encoded_pass = base64.b64encode(password.encode()).decode()
         self._execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?), (?, ?), (?, ?)",
@@ -72,49 +499,490 @@ class DatabaseManager:
             'password': base64.b64decode(creds['password']).decode()
         }
 
+    # --- Preferencias ---
+    def get_setting(self, key):
+        row = self._execute("SELECT value FROM settings WHERE key = ?", (key,), fetchone=True)
+        return row['value'] if row else None
+
+    @_writes
+    def set_setting(self, key, value):
+        self._execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value), commit=True)
+
+    # --- Validadores HTTP (ETag) ---
+    def get_etag(self, endpoint):
+        row = self._execute("SELECT etag FROM http_etags WHERE endpoint = ?", (endpoint,), fetchone=True)
+        return row['etag'] if row else None
+
+    @_writes
+    def save_etag(self, endpoint, etag):
+        self._execute("INSERT OR REPLACE INTO http_etags (endpoint, etag) VALUES (?, ?)", (endpoint, etag),
+                      commit=True)
+
+    @_writes
+    def clear_etags(self):
+        self._execute("DELETE FROM http_etags", commit=True)
+
     # --- Operaciones de Datos ---
+    @_writes
     def save_boards(self, boards):
-        self._execute("DELETE FROM boards", commit=True)
-        if boards:
-            for board in boards:
-                self._execute("INSERT OR REPLACE INTO boards (id, title, color) VALUES (?, ?, ?)",
-                              (board['id'], board['title'], board.get('color')), commit=True)
+        """
+        Sustituye la lista de tableros. Los que ya no devuelve la API se borran junto con sus pilas,
+        tarjetas, etiquetas y ETag, para que no aparezcan en búsquedas, agenda ni filtros por etiqueta.
+        """
+        board_ids = {board['id'] for board in boards or []}
+        with self._transaction() as conn:
+            vanished = [(row['id'],) for row in conn.execute("SELECT id FROM boards") if row['id'] not in board_ids]
+            # Las cards no tienen clave foránea: se borran a mano (los triggers limpian el índice de búsqueda)
+            conn.executemany("DELETE FROM card_labels WHERE card_id IN (SELECT id FROM cards WHERE board_id = ?)",
+                             vanished)
+            conn.executemany("DELETE FROM cards WHERE board_id = ?", vanished)
+            conn.executemany("DELETE FROM stacks WHERE board_id = ?", vanished)
+            conn.executemany("DELETE FROM labels WHERE board_id = ?", vanished)
+            conn.executemany("DELETE FROM http_etags WHERE endpoint = ?",
+                             [(f"boards/{board_id}/stacks",) for board_id, in vanished])
+            conn.execute("DELETE FROM boards")
+            if boards:
+                conn.executemany("INSERT OR REPLACE INTO boards (id, title, color) VALUES (?, ?, ?)",
+                                 [(board['id'], board['title'], board.get('color')) for board in boards])
 
     def get_boards(self):
         return self._execute("SELECT * FROM boards", fetchall=True)
 
+    _STACK_UPSERT = "INSERT OR REPLACE INTO stacks (id, board_id, title, \"order\", content_hash) VALUES (?, ?, ?, ?, ?)"
+    # UPSERT en lugar de INSERT OR REPLACE: el REPLACE no dispara los triggers de
+    # borrado y dejaría entradas obsoletas en el índice de búsqueda
+    _CARD_UPSERT = (
+        "INSERT INTO cards (id, stack_id, board_id, title, description, duedate, labels_json, \"order\", "
+        f"content_hash, due_at) VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, {DUE_EPOCH_SQL.format('?6')}) "
+        "ON CONFLICT (id) DO UPDATE SET stack_id = excluded.stack_id, "
+        "board_id = excluded.board_id, title = excluded.title, description = excluded.description, "
+        "duedate = excluded.duedate, labels_json = excluded.labels_json, \"order\" = excluded.\"order\", "
+        "content_hash = excluded.content_hash, due_at = excluded.due_at")
+
+    @staticmethod
+    def _stack_row(board_id, stack):
+        # --- CAMBIO --- Se guarda el valor de "order"
+        return stack['id'], board_id, stack['title'], stack.get('order')
+
+    @staticmethod
+    def _card_row(board_id, stack_id, card):
+        return (card['id'], stack_id, board_id, card['title'], card.get('description'),
+                card.get('duedate'), json.dumps(card.get('labels', [])), card.get('order'))
+
+    @_writes
     def save_stacks_and_cards(self, board_id, stacks):
-        self._execute("DELETE FROM stacks WHERE board_id = ?", (board_id,), commit=True)
-        self._execute("DELETE FROM cards WHERE board_id = ?", (board_id,), commit=True)
-        if stacks:
-            for stack in stacks:
-                # --- CAMBIO --- Se guarda el valor de "order"
-                self._execute("INSERT OR REPLACE INTO stacks (id, board_id, title, \"order\") VALUES (?, ?, ?, ?)",
-                              (stack['id'], board_id, stack['title'], stack.get('order')), commit=True)
-                cards_from_stack = stack.get('cards', [])
-                if cards_from_stack:
-                    for card in cards_from_stack:
-                        self._execute(
-                            "INSERT OR REPLACE INTO cards (id, stack_id, board_id, title, description, duedate, labels_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (card['id'], stack['id'], board_id, card['title'], card.get('description'),
-                             card.get('duedate'), json.dumps(card.get('labels', []))),
-                            commit=True
-                        )
+        """
+        Reconcilia las pilas y tarjetas de un tablero con las de la API en una sola transacción.
+        Solo se escriben las filas cuyo contenido ha cambiado y solo se borran las que han
+        desaparecido. Devuelve los ids afectados:
+        {'stacks': {'added': [...], 'updated': [...], 'removed': [...]}, 'cards': {..., 'moved': [...]}}
+        donde 'moved' son las tarjetas actualizadas que han cambiado de pila.
+        """
+        stack_rows = {}
+        card_rows = {}
+        card_labels = {}
+        for stack in stacks or []:
+            stack_rows[stack['id']] = self._stack_row(board_id, stack)
+            for card in stack.get('cards') or []:
+                card_rows[card['id']] = self._card_row(board_id, stack['id'], card)
+                card_labels[card['id']] = card.get('labels') or []
+
+        with self._transaction() as conn:
+            stack_changes = self._reconcile(conn, 'stacks', board_id, stack_rows, self._STACK_UPSERT)
+            card_changes = self._reconcile(conn, 'cards', board_id, card_rows, self._CARD_UPSERT,
+                                           parent=('stack_id', 1))
+            # Solo se reescriben las etiquetas de las tarjetas nuevas o modificadas
+            self._replace_card_labels(
+                conn, board_id,
+                {card_id: card_labels[card_id] for card_id in card_changes['added'] + card_changes['updated']},
+                card_changes['removed'])
+        return {'stacks': stack_changes, 'cards': card_changes}
+
+    def save_stacks_and_cards_stream(self, board_id, batches):
+        """
+        Igual que save_stacks_and_cards, pero recibe las pilas y tarjetas por lotes a medida que
+        se leen de la red (listas de ('stack', pila) y ('card', stack_id, tarjeta), ver json_stream).
+        Cada lote se compara con la caché y se escribe como una operación corta del hilo escritor,
+        así que la memoria depende del tamaño del lote y no del tablero. Mientras se escribe un
+        lote se lee el siguiente. Las filas que han desaparecido se borran al final: si la lectura
+        falla a medias, el tablero queda actualizado en parte pero sin borrados, y se completa
+        en la siguiente sincronización.
+        """
+        changes = {'stacks': {'added': [], 'updated': [], 'removed': []},
+                   'cards': {'added': [], 'updated': [], 'removed': [], 'moved': []}}
+        stream_id = self._write(self._start_stream)
+        try:
+            removed = self._save_stream_batches(board_id, stream_id, batches, changes)
+        except BaseException:
+            # Los ids vistos de una lectura fallida no deben quedarse en la tabla temporal
+            self.submit_write(self._discard_stream, stream_id)
+            raise
+        for kind in ('stacks', 'cards'):
+            changes[kind]['removed'] = removed[kind]
+        return changes
+
+    def _save_stream_batches(self, board_id, stream_id, batches, changes):
+        pending = None
+        for batch in batches:
+            stack_rows = {}
+            card_rows = {}
+            card_labels = {}
+            for item in batch:
+                if item[0] == 'stack':
+                    stack_rows[item[1]['id']] = self._stack_row(board_id, item[1])
+                else:
+                    _, stack_id, card = item
+                    card_rows[card['id']] = self._card_row(board_id, stack_id, card)
+                    card_labels[card['id']] = card.get('labels') or []
+            future = self.submit_write(self._save_stream_batch, board_id, stream_id, stack_rows, card_rows,
+                                       card_labels)
+            # Como mucho un lote en vuelo, para que la memoria siga acotada
+            if pending is not None:
+                self._merge_stream_changes(changes, pending.result())
+            pending = future
+        if pending is not None:
+            self._merge_stream_changes(changes, pending.result())
+
+        return self._write(self._finish_stream, board_id, stream_id)
+
+    @staticmethod
+    def _merge_stream_changes(changes, batch_changes):
+        for kind, kind_changes in batch_changes.items():
+            for change, ids in kind_changes.items():
+                changes[kind][change].extend(ids)
+
+    def _start_stream(self):
+        """
+        Empieza una lectura por lotes y devuelve su id. Los ids recibidos en cada lectura se
+        guardan en una tabla temporal de la conexión del escritor, para saber al final qué filas
+        ya no existen. Van separados por lectura y no por tablero: dos lecturas simultáneas del
+        mismo tablero (p. ej. al abrirlo durante una sincronización) no deben mezclarse.
+        """
+        conn = self._get_connection()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS stream_seen_ids (stream_id INTEGER NOT NULL, "
+                     "kind TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (stream_id, kind, id)) WITHOUT ROWID")
+        return next(self._stream_ids)
+
+    def _discard_stream(self, stream_id):
+        self._get_connection().execute("DELETE FROM stream_seen_ids WHERE stream_id = ?", (stream_id,))
+
+    def _save_stream_batch(self, board_id, stream_id, stack_rows, card_rows, card_labels):
+        conn = self._get_connection()
+        batch_changes = {}
+        for kind, rows, upsert_sql, parent in (('stacks', stack_rows, self._STACK_UPSERT, None),
+                                               ('cards', card_rows, self._CARD_UPSERT, ('stack_id', 1))):
+            if not rows:
+                continue
+            cached = self._cached_hashes(conn, kind, rows, parent)
+            kind_changes = self._write_changed_rows(conn, kind, rows, cached, upsert_sql, parent)
+            if not parent:
+                del kind_changes['moved']
+            batch_changes[kind] = kind_changes
+            conn.executemany("INSERT OR IGNORE INTO stream_seen_ids (stream_id, kind, id) VALUES (?, ?, ?)",
+                             [(stream_id, kind, row_id) for row_id in rows])
+        if card_rows:
+            self._replace_card_labels(
+                conn, board_id, {card_id: card_labels[card_id] for card_id in
+                                 batch_changes['cards']['added'] + batch_changes['cards']['updated']}, [])
+        return batch_changes
+
+    def _finish_stream(self, board_id, stream_id):
+        conn = self._get_connection()
+        removed = {}
+        for kind in ('stacks', 'cards'):
+            # Los ids negativos son filas locales que el servidor aún no ha confirmado
+            removed[kind] = [row[0] for row in conn.execute(
+                f"SELECT id FROM {kind} WHERE board_id = ? AND id >= 0 AND id NOT IN "
+                "(SELECT id FROM stream_seen_ids WHERE stream_id = ? AND kind = ?)", (board_id, stream_id, kind))]
+            conn.executemany(f"DELETE FROM {kind} WHERE id = ?", [(row_id,) for row_id in removed[kind]])
+        self._replace_card_labels(conn, board_id, {}, removed['cards'])
+        self._discard_stream(stream_id)
+        return removed
+
+    @staticmethod
+    def _replace_card_labels(conn, board_id, labels_by_card, removed_card_ids):
+        """Actualiza labels y card_labels para las tarjetas dadas ({card_id: etiquetas de la API})."""
+        conn.executemany("DELETE FROM card_labels WHERE card_id = ?",
+                         [(card_id,) for card_id in list(labels_by_card) + list(removed_card_ids)])
+        label_rows = {}
+        link_rows = []
+        for card_id, labels in labels_by_card.items():
+            for label in labels:
+                if label.get('id') is None:
+                    continue
+                label_rows[label['id']] = (label['id'], board_id, label.get('title', ''), label.get('color'))
+                link_rows.append((card_id, label['id']))
+        conn.executemany(
+            "INSERT INTO labels (id, board_id, title, color) VALUES (?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+            "board_id = excluded.board_id, title = excluded.title, color = excluded.color", list(label_rows.values()))
+        conn.executemany("INSERT OR IGNORE INTO card_labels (card_id, label_id) VALUES (?, ?)", link_rows)
+
+    def _reconcile(self, conn, table, board_id, rows, upsert_sql, parent=None):
+        """
+        Compara las filas nuevas con las cacheadas del tablero y aplica solo las diferencias.
+        parent=(columna, posición en la fila): además se devuelven en 'moved' los ids
+        actualizados cuyo padre ha cambiado, p. ej. tarjetas movidas de pila.
+        """
+        parent_column = f", {parent[0]} AS parent" if parent else ", NULL AS parent"
+        cached = {r['id']: (r['content_hash'], r['parent']) for r in conn.execute(
+            f"SELECT id, content_hash{parent_column} FROM {table} WHERE board_id = ?", (board_id,))}
+        changes = self._write_changed_rows(conn, table, rows, cached, upsert_sql, parent)
+        # Los ids negativos son filas creadas localmente que el servidor aún no ha confirmado
+        removed = [row_id for row_id in cached if row_id not in rows and row_id >= 0]
+        conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id in removed])
+        changes['removed'] = removed
+        if not parent:
+            del changes['moved']
+        return changes
+
+    @staticmethod
+    def _cached_hashes(conn, table, rows, parent=None):
+        """{id: (content_hash, padre)} de las filas cacheadas con los ids dados (por lotes de 500)."""
+        parent_column = f", {parent[0]}" if parent else ", NULL"
+        ids = list(rows)
+        cached = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in conn.execute(f"SELECT id, content_hash{parent_column} FROM {table} "
+                                    f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                cached[row[0]] = (row[1], row[2])
+        return cached
+
+    def _write_changed_rows(self, conn, table, rows, cached, upsert_sql, parent=None):
+        """Escribe las filas nuevas o cuyo hash ha cambiado respecto a cached ({id: (hash, padre)})."""
+        added, updated, moved, to_write = [], [], [], []
+        for row_id, row in rows.items():
+            row_hash = self._row_hash(row)
+            if row_id not in cached:
+                added.append(row_id)
+            elif cached[row_id][0] != row_hash:
+                updated.append(row_id)
+                if parent and cached[row_id][1] != row[parent[1]]:
+                    moved.append(row_id)
+            else:
+                continue
+            to_write.append(row + (row_hash,))
+        conn.executemany(upsert_sql, to_write)
+        return {'added': added, 'updated': updated, 'moved': moved}
 
     def get_stacks(self, board_id):
         return self._execute("SELECT * FROM stacks WHERE board_id = ?", (board_id,), fetchall=True)
 
     def get_cards(self, stack_id):
-        return self._execute("SELECT * FROM cards WHERE stack_id = ?", (stack_id,), fetchall=True)
+        return self._execute(f"SELECT {_card_columns()} FROM cards WHERE stack_id = ? ORDER BY \"order\", id",
+                             (stack_id,), fetchall=True)
+
+    def _select_by_ids(self, table, ids, columns='*'):
+        rows = []
+        ids = list(ids)
+        # Por lotes, para no superar el límite de parámetros de SQLite
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows += self._execute(f"SELECT {columns} FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})",
+                                  tuple(chunk), fetchall=True)
+        return rows
+
+    def get_stacks_by_ids(self, stack_ids):
+        return self._select_by_ids('stacks', stack_ids)
+
+    def get_cards_by_ids(self, card_ids):
+        return self._select_by_ids('cards', card_ids, _card_columns())
+
+    def get_card(self, card_id):
+        """La tarjeta con las columnas de la lista (CARD_LIST_COLUMNS)."""
+        return self._execute(f"SELECT {_card_columns()} FROM cards WHERE id = ?", (card_id,), fetchone=True)
+
+    def get_card_detail(self, card_id):
+        """La tarjeta completa, incluida la descripción, para el diálogo de edición."""
+        return self._execute("SELECT * FROM cards WHERE id = ?", (card_id,), fetchone=True)
+
+    # --- Escrituras locales optimistas ---
+    # Las filas creadas sin conexión con el servidor reciben un id temporal negativo, que se
+    # sustituye por el definitivo (resolve_local_stack / resolve_local_card) cuando la API responde.
+    @staticmethod
+    def _next_temp_id(conn, table):
+        """
+        Siguiente id temporal, siempre decreciente: un id ya resuelto no se vuelve a usar, porque
+        DataManager sigue traduciéndolo al definitivo. El último asignado se guarda en settings.
+        """
+        last = conn.execute("SELECT value FROM settings WHERE key = 'last_temp_id'").fetchone()
+        lowest = conn.execute(f"SELECT MIN(COALESCE(MIN(id), 0), ?, 0) FROM {table}",
+                              (int(last[0]) if last else 0,)).fetchone()[0]
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('last_temp_id', ?)", (str(lowest - 1),))
+        return lowest - 1
+
+    @_writes
+    def insert_local_stack(self, board_id, title):
+        """Crea una pila local al final del tablero; el orden se calcula con MAX() en SQL."""
+        with self._transaction(immediate=True) as conn:
+            stack_id = self._next_temp_id(conn, 'stacks')
+            order = conn.execute("SELECT COALESCE(MAX(\"order\"), 0) + 1 FROM stacks WHERE board_id = ?",
+                                 (board_id,)).fetchone()[0]
+            conn.execute("INSERT INTO stacks (id, board_id, title, \"order\") VALUES (?, ?, ?, ?)",
+                         (stack_id, board_id, title, order))
+        return {'id': stack_id, 'board_id': board_id, 'title': title, 'order': order}
+
+    @_writes
+    def insert_local_card(self, board_id, stack_id, title):
+        """Crea una tarjeta local al final de su pila; el orden se calcula con MAX() en SQL."""
+        with self._transaction(immediate=True) as conn:
+            card_id = self._next_temp_id(conn, 'cards')
+            order = conn.execute("SELECT COALESCE(MAX(\"order\"), 0) + 1 FROM cards WHERE stack_id = ?",
+                                 (stack_id,)).fetchone()[0]
+            conn.execute("INSERT INTO cards (id, stack_id, board_id, title, labels_json, \"order\") "
+                         "VALUES (?, ?, ?, ?, '[]', ?)", (card_id, stack_id, board_id, title, order))
+        return self.get_card(card_id)
+
+    @_writes
+    def resolve_local_stack(self, temp_id, stack_id):
+        """Sustituye el id temporal de una pila por el del servidor, también en sus tarjetas y en la cola."""
+        with self._transaction(immediate=True) as conn:
+            conn.execute("INSERT OR IGNORE INTO stacks (id, board_id, title, \"order\") "
+                         "SELECT ?, board_id, title, \"order\" FROM stacks WHERE id = ?", (stack_id, temp_id))
+            conn.execute("DELETE FROM stacks WHERE id = ?", (temp_id,))
+            conn.execute("UPDATE cards SET stack_id = ? WHERE stack_id = ?", (stack_id, temp_id))
+            self._rewrite_offline_endpoints(conn, 'stacks', temp_id, stack_id)
+        return self._execute("SELECT * FROM stacks WHERE id = ?", (stack_id,), fetchone=True)
+
+    @_writes
+    def resolve_local_card(self, temp_id, card_id):
+        """Sustituye el id temporal de una tarjeta por el del servidor, también en la cola offline."""
+        with self._transaction(immediate=True) as conn:
+            # Se reinserta en lugar de cambiar el id para que los triggers actualicen el índice de búsqueda.
+            # Si una sincronización ya trajo la tarjeta definitiva, solo se borra la temporal.
+            conn.execute("INSERT OR IGNORE INTO cards (id, stack_id, board_id, title, description, duedate, "
+                         "labels_json, \"order\", due_at) SELECT ?, stack_id, board_id, title, description, duedate, "
+                         "labels_json, \"order\", due_at FROM cards WHERE id = ?", (card_id, temp_id))
+            conn.execute("DELETE FROM cards WHERE id = ?", (temp_id,))
+            self._rewrite_offline_endpoints(conn, 'cards', temp_id, card_id)
+        return self.get_card(card_id)
+
+    @staticmethod
+    def replace_endpoint_id(endpoint, kind, old_id, new_id):
+        """Cambia el id de un segmento del endpoint, p. ej. .../cards/-3 -> .../cards/125."""
+        return re.sub(rf"/{kind}/{old_id}(?=/|$)", f"/{kind}/{new_id}", endpoint)
+
+    def _rewrite_offline_endpoints(self, conn, kind, old_id, new_id):
+        rows = conn.execute("SELECT id, endpoint FROM offline_changes WHERE endpoint LIKE ?",
+                            (f"%/{kind}/{old_id}%",)).fetchall()
+        conn.executemany("UPDATE offline_changes SET endpoint = ? WHERE id = ?",
+                         [(self.replace_endpoint_id(row['endpoint'], kind, old_id, new_id), row['id'])
+                          for row in rows])
+
+    def get_labels(self, board_id=None):
+        if board_id is None:
+            return self._execute("SELECT * FROM labels ORDER BY board_id, title", fetchall=True)
+        return self._execute("SELECT * FROM labels WHERE board_id = ? ORDER BY title", (board_id,), fetchall=True)
+
+    def get_cards_with_label(self, title, board_id=None):
+        """Tarjetas que tienen una etiqueta con ese título (sin distinguir mayúsculas), en uno o todos los tableros."""
+        sql = (f"SELECT {_card_columns('c')} FROM labels l JOIN card_labels cl ON cl.label_id = l.id "
+               "JOIN cards c ON c.id = cl.card_id WHERE l.title = ? COLLATE NOCASE")
+        params = [title]
+        if board_id is not None:
+            sql += " AND l.board_id = ?"
+            params.append(board_id)
+        return self._execute(sql + " ORDER BY c.board_id, c.stack_id, c.id", tuple(params), fetchall=True)
+
+    @_writes
+    def update_card_fields(self, card_id, **fields):
+        """Aplica en la caché local una edición de tarjeta (solo columnas conocidas)."""
+        columns = {k: v for k, v in fields.items() if k in ('title', 'description', 'duedate')}
+        if not columns:
+            return
+        # Se borra el hash para que el próximo refresco reescriba la fila con lo que diga el servidor
+        # aunque coincida con el contenido que había antes de la edición local
+        assignments = [f"{column} = ?" for column in columns] + ["content_hash = NULL"]
+        params = list(columns.values())
+        if 'duedate' in columns:
+            assignments.append(f"due_at = {DUE_EPOCH_SQL.format('?')}")
+            params.append(columns['duedate'])
+        self._execute(f"UPDATE cards SET {', '.join(assignments)} WHERE id = ?", (*params, card_id), commit=True)
+
+    def get_cards_due(self, start=None, end=None, limit=50, after=None):
+        """
+        Tarjetas de todos los tableros con fecha límite en [start, end) (segundos UTC; None = sin
+        límite), ordenadas por vencimiento e incluyendo el título de su tablero y su pila.
+        Se pagina por clave: after es el (due_at, id) de la última tarjeta de la página anterior.
+        """
+        sql = (f"SELECT {_card_columns('c')}, b.title AS board_title, s.title AS stack_title FROM cards c "
+               "LEFT JOIN boards b ON b.id = c.board_id LEFT JOIN stacks s ON s.id = c.stack_id "
+               "WHERE c.due_at IS NOT NULL")
+        params = []
+        if start is not None:
+            sql += " AND c.due_at >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND c.due_at < ?"
+            params.append(end)
+        if after is not None:
+            sql += " AND (c.due_at, c.id) > (?, ?)"
+            params.extend(after)
+        sql += " ORDER BY c.due_at, c.id LIMIT ?"
+        params.append(limit)
+        return self._execute(sql, tuple(params), fetchall=True)
+
+    def search_cards(self, query, board_id=None, limit=50):
+        """
+        Búsqueda de texto completo en título y descripción, ordenada por relevancia (bm25,
+        con más peso para el título). Cada resultado incluye un fragmento con los términos marcados.
+        """
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        # Cada término se busca como prefijo y entre comillas para no interpretar sintaxis FTS
+        match = " ".join(f'"{term}"*' for term in terms)
+        sql = (f"SELECT {_card_columns('c')}, snippet(cards_fts, -1, '[', ']', '…', 12) AS snippet, "
+               "bm25(cards_fts, 10.0, 1.0) AS rank FROM cards_fts JOIN cards c ON c.id = cards_fts.rowid "
+               "WHERE cards_fts MATCH ?")
+        params = [match]
+        if board_id is not None:
+            sql += " AND c.board_id = ?"
+            params.append(board_id)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return self._execute(sql, tuple(params), fetchall=True)
+
+    def get_board_contents(self, board_id):
+        """
+        Devuelve (pilas, {stack_id: tarjetas}) de un tablero con una única consulta,
+        con las pilas ordenadas por su campo "order".
+        """
+        rows = self._execute(
+            f"SELECT s.id AS s_id, s.title AS s_title, s.\"order\" AS s_order, {_card_columns('c')} "
+            "FROM stacks s LEFT JOIN cards c ON c.stack_id = s.id WHERE s.board_id = ? ORDER BY s.\"order\", s.id, c.\"order\", c.id",
+            (board_id,), fetchall=True)
+        stacks = []
+        cards_by_stack = {}
+        for row in rows:
+            stack_id = row.pop('s_id')
+            stack_title, stack_order = row.pop('s_title'), row.pop('s_order')
+            if stack_id not in cards_by_stack:
+                stacks.append({'id': stack_id, 'board_id': board_id, 'title': stack_title, 'order': stack_order})
+                cards_by_stack[stack_id] = []
+            if row['id'] is not None:
+                cards_by_stack[stack_id].append(row)
+        return stacks, cards_by_stack
 
     # --- Cambios Offline ---
-    def queue_offline_change(self, method, endpoint, payload):
-        self._execute("INSERT INTO offline_changes (method, endpoint, payload) VALUES (?, ?, ?)",
-                      (method.upper(), endpoint, json.dumps(payload)), commit=True)
+    @_writes
+    def queue_offline_change(self, method, endpoint, payload, local_id=None):
+        """local_id: id temporal de la fila que crea el cambio, para resolverlo al reenviarlo."""
+        self._execute("INSERT INTO offline_changes (method, endpoint, payload, local_id) VALUES (?, ?, ?, ?)",
+                      (method.upper(), endpoint, json.dumps(payload), local_id), commit=True)
 
     def get_offline_changes(self):
         return self._execute("SELECT * FROM offline_changes ORDER BY id", fetchall=True)
 
+    @_writes
     def delete_offline_change(self, change_id):
         self._execute("DELETE FROM offline_changes WHERE id = ?", (change_id,), commit=True)
 
+
+    @_writes
+    def rewrite_offline_changes(self, updated_payloads, deleted_ids):
+        """Aplica en una sola transacción el resultado de compactar la cola offline."""
+        with self._transaction() as conn:
+            conn.executemany("UPDATE offline_changes SET payload = ? WHERE id = ?",
+                             [(json.dumps(payload), change_id) for change_id, payload in updated_payloads.items()])
+            conn.executemany("DELETE FROM offline_changes WHERE id = ?", [(change_id,) for change_id in deleted_ids])
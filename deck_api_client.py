@@ -1,6 +1,114 @@
+import asyncio
+import functools
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
+from json_stream import StacksStreamParser, iter_batches
+from metrics import metrics
+
+# Valor devuelto por las peticiones condicionales cuando el servidor responde 304 Not Modified
+NOT_MODIFIED = object()
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Se lanza sin contactar con el servidor mientras el circuito está abierto."""
+
+
+class RetryPolicy:
+    """
+    Política de reintentos para errores transitorios (errores de conexión, 429, 502, 503, 504).
+    Usa backoff exponencial con jitter completo, respeta la cabecera Retry-After y no
+    supera max_elapsed segundos en total. Los POST no son idempotentes, así que solo se
+    reintentan cuando el servidor indica que no los ha procesado (429 y 503).
+    """
+
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=30.0, max_elapsed=60.0,
+                 retry_statuses=(429, 502, 503, 504), non_idempotent_retry_statuses=(429, 503)):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_elapsed = max_elapsed
+        self.retry_statuses = set(retry_statuses)
+        self.non_idempotent_retry_statuses = set(non_idempotent_retry_statuses)
+
+    def is_retryable(self, method, status_code=None):
+        """status_code=None indica un error de conexión o un timeout."""
+        if method.upper() == 'POST':
+            return status_code in self.non_idempotent_retry_statuses
+        return status_code is None or status_code in self.retry_statuses
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Convierte Retry-After (segundos o fecha HTTP) en segundos de espera."""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+
+class CircuitBreaker:
+    """
+    Abre el circuito tras failure_threshold fallos transitorios consecutivos. Mientras está
+    abierto las peticiones fallan de inmediato; pasado reset_timeout se deja pasar una única
+    petición de prueba, cuyo resultado vuelve a cerrar o a abrir el circuito.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        """Indica si se puede contactar con el servidor, sin consumir la petición de prueba."""
+        with self._lock:
+            return self.state != self.OPEN or time.monotonic() - self._opened_at >= self.reset_timeout
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            # Abierto, o ya hay una petición de prueba en curso
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
 
 class DeckAPIClient:
     """
@@ -8,23 +116,62 @@ class DeckAPIClient:
     Se encarga exclusivamente de las peticiones HTTP.
     """
 
-    def __init__(self, url, username, password):
+    def __init__(self, url, username, password, validator_store=None, retry_policy=None, circuit_breaker=None,
+                 timeout=30, verify=True, pool_maxsize=10):
+        """
+        validator_store: objeto opcional con get_etag(endpoint) y save_etag(endpoint, etag)
+        (p. ej. DatabaseManager) donde se guardan los ETag de las peticiones condicionales.
+        pool_maxsize: conexiones que se mantienen abiertas con el servidor; debe ser al menos el
+        número de peticiones simultáneas de AsyncDeckAPIClient para que todas se reutilicen.
+        verify: si es False no se comprueban las credenciales al crear el cliente;
+        se puede hacer más tarde con verify_credentials().
+        """
+        self.validator_store = validator_store
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.timeout = timeout
         self.base_url = f"{url.rstrip('/')}/index.php/apps/deck/api/v1.0"
         self.session = requests.Session()
         self.session.auth = HTTPBasicAuth(username, password)
+        # Un único pool para las peticiones síncronas y las de AsyncDeckAPIClient
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json',
             'OCS-APIRequest': 'true',
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
-        # Lanza una petición inicial para verificar la conexión y las credenciales
-        self.get_boards()
+        if verify:
+            self.verify_credentials()
 
-    def _api_request(self, method, endpoint, data=None):
-        """Método auxiliar para realizar peticiones a la API."""
+    def verify_credentials(self):
+        """Lanza una petición para verificar la conexión y las credenciales."""
+        self._api_request('GET', 'boards')
+
+    def _api_request(self, method, endpoint, data=None, conditional=False, stream=False, save_etag=True):
+        """
+        Método auxiliar para realizar peticiones a la API.
+        Con conditional=True se envía el último ETag conocido del endpoint (If-None-Match)
+        y, si el servidor responde 304, se devuelve NOT_MODIFIED en lugar de los datos.
+        Con save_etag=False el ETag no se guarda: se devuelve (datos, ETag) para que quien llama
+        lo guarde cuando haya guardado los datos.
+        Con stream=True se devuelve la respuesta sin leer el cuerpo (y sin guardar su ETag):
+        quien la recibe debe leerla y cerrarla.
+        """
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = self.session.request(method, url, json=data)
+        headers = {}
+        conditional = conditional and self.validator_store is not None
+        if conditional:
+            etag = self.validator_store.get_etag(endpoint)
+            if etag:
+                headers['If-None-Match'] = etag
+        response = self._send_with_retry(method, url, data, headers, stream)
+
+        if conditional and response.status_code == 304:
+            response.close()
+            return NOT_MODIFIED
 
         try:
             response.raise_for_status()
@@ -39,14 +186,89 @@ class DeckAPIClient:
             # --- FIN DEL CAMBIO ---
             raise e  # Volvemos a lanzar la excepción para que el resto del programa la maneje
 
-        return response.json() if response.status_code != 204 else None
+        if stream:
+            return response
+        result = response.json() if response.status_code != 204 else None
+        if not save_etag:
+            return result, response.headers.get('ETag')
+        if conditional and response.headers.get('ETag'):
+            self.validator_store.save_etag(endpoint, response.headers['ETag'])
+        return result
+
+    def _send_with_retry(self, method, url, data, headers, stream=False):
+        """Envía la petición aplicando la política de reintentos y el circuit breaker."""
+        # Etiqueta de métricas: el endpoint sin ids, para agrupar p. ej. todas las pilas de tableros
+        endpoint_label = re.sub(r'/\d+', '/{id}', url[len(self.base_url):]) or '/'
+        if not self.circuit_breaker.allow_request():
+            metrics.increment('deck_api_circuit_rejections', method=method, endpoint=endpoint_label)
+            raise CircuitOpenError(f"Servidor no disponible temporalmente: {self.base_url}")
+
+        policy = self.retry_policy
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            error = response = None
+            retry_after = None
+            request_start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, json=data, headers=headers, timeout=self.timeout,
+                                                stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            except BaseException:
+                # Cualquier otro fallo (p. ej. ChunkedEncodingError con un cuerpo cortado) también
+                # cuenta: si era la petición de prueba, el circuito no debe quedarse medio abierto
+                self.circuit_breaker.record_failure()
+                raise
+            if metrics.enabled:
+                status = response.status_code if response is not None else type(error).__name__
+                metrics.observe('deck_api_request_seconds', time.perf_counter() - request_start,
+                                method=method, endpoint=endpoint_label, status=status)
+            if response is not None:
+                if response.status_code not in policy.retry_statuses:
+                    # El servidor ha respondido (aunque sea con un error propio de la petición)
+                    self.circuit_breaker.record_success()
+                    return response
+                retry_after = policy.parse_retry_after(response.headers.get('Retry-After'))
+
+            status_code = response.status_code if response is not None else None
+            delay = policy.delay(attempt, retry_after)
+            if (attempt >= policy.max_retries or not policy.is_retryable(method, status_code)
+                    or time.monotonic() - start + delay > policy.max_elapsed):
+                self.circuit_breaker.record_failure()
+                if error is not None:
+                    raise error
+                return response
+
+            print(f"Error transitorio en {method} {url} ({status_code or error}); reintentando en {delay:.1f} s")
+            if response is not None:
+                # Devuelve la conexión al pool aunque el cuerpo no se haya leído (stream=True)
+                response.close()
+            metrics.increment('deck_api_retries', method=method, endpoint=endpoint_label)
+            time.sleep(delay)
+            attempt += 1
 
     # --- Métodos de la API ---
-    def get_boards(self):
-        return self._api_request('GET', 'boards')
+    def get_boards(self, save_etag=True):
+        """
+        Lista de tableros, o NOT_MODIFIED. Con save_etag=False se devuelve (tableros, ETag) y el
+        ETag no se guarda: debe guardarse con save_etag('boards', etag) después de guardar los tableros.
+        """
+        return self._api_request('GET', 'boards', conditional=True, save_etag=save_etag)
 
     def get_stacks_with_cards(self, board_id):
-        return self._api_request('GET', f'boards/{board_id}/stacks')
+        return self._api_request('GET', f'boards/{board_id}/stacks', conditional=True)
+
+    def get_stacks_with_cards_stream(self, board_id, batch_size=500):
+        """
+        Como get_stacks_with_cards, pero sin cargar la respuesta entera en memoria: devuelve
+        NOT_MODIFIED o un StacksStream que entrega las pilas y tarjetas por lotes.
+        """
+        endpoint = f'boards/{board_id}/stacks'
+        response = self._api_request('GET', endpoint, conditional=True, stream=True)
+        if response is NOT_MODIFIED:
+            return NOT_MODIFIED
+        return StacksStream(self, endpoint, response, batch_size)
 
     def create_board(self, title, color):
         return self._api_request('POST', 'boards', data={'title': title, 'color': color})
@@ -60,3 +282,107 @@ class DeckAPIClient:
     def update_card(self, board_id, stack_id, card_id, **kwargs):
         return self._api_request('PUT', f'boards/{board_id}/stacks/{stack_id}/cards/{card_id}', data=kwargs)
 
+
+class StacksStream:
+    """
+    Respuesta de boards/{id}/stacks leída de forma incremental. Al iterarla se obtienen
+    lotes de como mucho batch_size elementos ('stack', pila) y ('card', stack_id, tarjeta).
+    El ETag no se guarda hasta llamar a save_etag(), una vez guardados los datos: si la
+    escritura falla a medias, la siguiente petición no puede responder 304 con datos a medias.
+    Se usa como gestor de contexto para liberar siempre la conexión:
+
+        with client.get_stacks_with_cards_stream(board_id) as stream:
+            db.save_stacks_and_cards_stream(board_id, stream)
+            stream.save_etag()
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, client, endpoint, response, batch_size=500):
+        self.client = client
+        self.endpoint = endpoint
+        self.response = response
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        parser = StacksStreamParser(self.response.iter_content(self.CHUNK_SIZE))
+        try:
+            yield from iter_batches(parser, self.batch_size)
+        except ValueError as e:
+            # Mismo tipo de error que response.json() con un cuerpo no válido
+            raise requests.exceptions.InvalidJSONError(
+                f"Respuesta no válida de {self.endpoint}: {e}", response=self.response) from e
+
+    def save_etag(self):
+        etag = self.response.headers.get('ETag')
+        if etag and self.client.validator_store is not None:
+            self.client.validator_store.save_etag(self.endpoint, etag)
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncDeckAPIClient:
+    """
+    Versión asíncrona de DeckAPIClient con la misma interfaz de métodos.
+    Las peticiones se ejecutan en hilos sobre la sesión (y el pool de conexiones, que no se
+    modifica; ver pool_maxsize en DeckAPIClient) del cliente síncrono, con un límite de
+    peticiones simultáneas. Los hilos son siempre
+    los mismos aunque cambie el bucle de eventos (cada asyncio.run crea uno nuevo), para
+    no abrir recursos por hilo (p. ej. conexiones SQLite) en cada sincronización.
+    """
+
+    def __init__(self, client, max_concurrency=8):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix='deck-api')
+
+    @classmethod
+    async def connect(cls, url, username, password, validator_store=None, max_concurrency=8):
+        """Crea el cliente verificando las credenciales sin bloquear el bucle de eventos."""
+        client = await asyncio.to_thread(functools.partial(DeckAPIClient, url, username, password, validator_store,
+                                                           pool_maxsize=max(max_concurrency, 10)))
+        return cls(client, max_concurrency)
+
+    async def _api_request(self, method, endpoint, data=None, conditional=False, save_etag=True):
+        return await self.run(self.client._api_request, method, endpoint, data, conditional, False, save_etag)
+
+    async def run(self, fn, *args):
+        """Ejecuta en un hilo una función síncrona que usa el cliente, con el límite de concurrencia."""
+        # El semáforo pertenece a un bucle de eventos: se crea uno por cada bucle en el que se usa
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        async with self._semaphore:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def close(self):
+        """Termina los hilos del cliente; no cierra la sesión del cliente síncrono."""
+        self._executor.shutdown(wait=False)
+
+    # --- Métodos de la API ---
+    async def get_boards(self, save_etag=True):
+        return await self._api_request('GET', 'boards', conditional=True, save_etag=save_etag)
+
+    async def get_stacks_with_cards(self, board_id):
+        return await self._api_request('GET', f'boards/{board_id}/stacks', conditional=True)
+
+    async def create_board(self, title, color):
+        return await self._api_request('POST', 'boards', data={'title': title, 'color': color})
+
+    async def create_stack(self, board_id, title):
+        return await self._api_request('POST', f'boards/{board_id}/stacks', data={'title': title})
+
+    async def create_card(self, board_id, stack_id, title):
+        return await self._api_request('POST', f'boards/{board_id}/stacks/{stack_id}/cards', data={'title': title})
+
+    async def update_card(self, board_id, stack_id, card_id, **kwargs):
+        return await self._api_request('PUT', f'boards/{board_id}/stacks/{stack_id}/cards/{card_id}', data=kwargs)
@@ -0,0 +1,176 @@
+"""
+Servidor HTTP local que imita la API de Nextcloud Deck, para benchmarks y pruebas.
+
+Genera tableros sintéticos de tamaño configurable (sin guardarlos todos en memoria) y
+permite simular latencia y errores transitorios. Las respuestas GET llevan ETag y se
+responde 304 a las peticiones condicionales cuyo If-None-Match coincide.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PREFIX = '/index.php/apps/deck/api/v1.0'
+
+
+def make_stacks(board_id, n_stacks, n_cards):
+    """Genera un tablero sintético con el mismo formato que devuelve la API de Deck."""
+    stacks = []
+    card_id = board_id * 1_000_000
+    for s in range(n_stacks):
+        stack_id = board_id * 1_000 + s
+        cards = []
+        for c in range(n_cards):
+            card_id += 1
+            cards.append({
+                'id': card_id,
+                'title': f"Tarjeta {card_id}",
+                'description': "Descripción de prueba " * 5,
+                'duedate': '2030-01-01T12:00:00+00:00' if c % 3 == 0 else None,
+                'labels': [{'id': board_id * 10 + 1, 'title': 'Urgente', 'color': 'ff0000'}] if c % 4 == 0 else [],
+            })
+        stacks.append({'id': stack_id, 'title': f"Pila {s}", 'order': s, 'cards': cards})
+    return stacks
+
+
+class FakeDeckServer:
+    """
+    Servidor Deck falso en 127.0.0.1 con n_boards tableros de n_stacks pilas y n_cards tarjetas.
+    latency: segundos de espera por petición. error_rate: fracción de peticiones que responden 503.
+    Se usa como gestor de contexto:
+
+        with FakeDeckServer(n_boards=100, n_stacks=20, n_cards=500, latency=0.05) as server:
+            client = DeckAPIClient(server.url, 'usuario', 'clave')
+    """
+
+    def __init__(self, n_boards=10, n_stacks=5, n_cards=20, latency=0.0, error_rate=0.0, seed=0):
+        self.n_boards = n_boards
+        self.n_stacks = n_stacks
+        self.n_cards = n_cards
+        self.latency = latency
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.error_count = 0
+        self.not_modified_count = 0
+        # Peticiones atendiéndose a la vez, y su máximo
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 10_000_000_000
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def boards(self):
+        return [{'id': board_id, 'title': f"Tablero {board_id}", 'color': '5e81ac'}
+                for board_id in range(1, self.n_boards + 1)]
+
+    def _should_fail(self):
+        with self._lock:
+            self.request_count += 1
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.error_count += 1
+            return fail
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def handle(self, method, path, payload):
+        """Devuelve (código de estado, cuerpo) para una petición a la API."""
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return self._handle(method, path, payload)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _handle(self, method, path, payload):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._should_fail():
+            return 503, {'message': 'Servicio no disponible (simulado)'}
+        if not path.startswith(API_PREFIX):
+            return 404, {'message': 'No encontrado'}
+        endpoint = path[len(API_PREFIX):].strip('/')
+
+        if endpoint == 'boards':
+            if method == 'GET':
+                return 200, self.boards()
+            return 200, {'id': self._new_id(), **(payload or {})}
+        match = re.fullmatch(r'boards/(\d+)/stacks', endpoint)
+        if match:
+            board_id = int(match.group(1))
+            if not 1 <= board_id <= self.n_boards:
+                return 404, {'message': 'Tablero no encontrado'}
+            if method == 'GET':
+                return 200, make_stacks(board_id, self.n_stacks, self.n_cards)
+            return 200, {'id': self._new_id(), 'boardId': board_id, **(payload or {})}
+        match = re.fullmatch(r'boards/(\d+)/stacks/(\d+)/cards(?:/(\d+))?', endpoint)
+        if match and method in ('POST', 'PUT'):
+            card_id = int(match.group(3)) if match.group(3) else self._new_id()
+            return 200, {'id': card_id, 'stackId': int(match.group(2)), **(payload or {})}
+        return 404, {'message': 'No encontrado'}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                payload = json.loads(raw) if raw else None
+                status, body = server.handle(self.command, self.path, payload)
+                data = json.dumps(body).encode()
+                etag = None
+                if self.command == 'GET' and status == 200:
+                    etag = f'"{hashlib.sha1(data).hexdigest()}"'
+                    if self.headers.get('If-None-Match') == etag:
+                        with server._lock:
+                            server.not_modified_count += 1
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        return
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,146 @@
+"""
+Lectura incremental de la respuesta JSON de boards/{id}/stacks.
+
+En lugar de construir todo el árbol de objetos de una vez (response.json()), se recorre el
+texto a medida que llegan los fragmentos y se entrega cada pila y cada tarjeta por separado,
+de modo que la memoria necesaria depende del tamaño del lote y no del tamaño del tablero.
+"""
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class StacksStreamParser:
+    """
+    Recorre un array JSON de pilas con la forma [{..., "cards": [{...}, ...]}, ...] leído de
+    un iterable de fragmentos de bytes, y genera:
+      ('card', stack_id, tarjeta)  por cada tarjeta, en cuanto se ha leído
+      ('stack', pila)              al cerrar cada pila (sin su lista de tarjetas)
+    Si el id de la pila todavía no se conoce al leer sus tarjetas (y estas no traen stackId),
+    esas tarjetas se guardan hasta el final de la pila.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_chars=1):
+        """
+        Añade al búfer al menos min_chars caracteres más (o lo que quede), descartando lo ya
+        consumido. Los fragmentos se unen una sola vez. False si no queda nada por leer.
+        """
+        parts = []
+        read = 0
+        while read < min_chars and not self._eof:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._eof = True
+                text = self._utf8.decode(b'', final=True)
+            else:
+                text = self._utf8.decode(chunk)
+            if text:
+                parts.append(text)
+                read += len(text)
+        if not parts:
+            return False
+        self._buffer = self._buffer[self._pos:] + ''.join(parts)
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Respuesta JSON incompleta")
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f"JSON inesperado en la posición {self._pos}: {char!r} (se esperaba {chars!r})")
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """
+        Lee un valor JSON completo, pidiendo más fragmentos mientras esté cortado. Cada reintento
+        espera a tener el doble de texto que el anterior: un valor que ocupa muchos fragmentos
+        (p. ej. una descripción de varios MB) se analiza unas pocas veces, no una por fragmento.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill(len(self._buffer) - self._pos):
+                    raise
+                continue
+            # Un número al final del búfer podría continuar en el siguiente fragmento
+            if end == len(self._buffer) and not self._eof and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def __iter__(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield from self._stack()
+            if self._expect(',]') == ']':
+                return
+
+    def _stack(self):
+        self._expect('{')
+        stack = {}
+        pending_cards = []
+        if self._peek() == '}':
+            self._pos += 1
+        else:
+            while True:
+                key = self._value()
+                self._expect(':')
+                if key == 'cards' and self._peek() == '[':
+                    for card in self._cards():
+                        stack_id = card.get('stackId', stack.get('id'))
+                        if stack_id is None:
+                            pending_cards.append(card)
+                        else:
+                            yield 'card', stack_id, card
+                else:
+                    stack[key] = self._value()
+                if self._expect(',}') == '}':
+                    break
+        yield 'stack', stack
+        for card in pending_cards:
+            yield 'card', stack['id'], card
+
+    def _cards(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(',]') == ']':
+                return
+
+
+def iter_batches(items, batch_size):
+    """Agrupa los elementos de un iterable en listas de como mucho batch_size elementos."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -1,23 +1,30 @@
 import sys
 import json
+import random
+import time
 import traceback
-from functools import partial
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime, timezone
 
 from PySide6.QtCore import QDate
 from PySide6.QtWidgets import QDateEdit
 
 from data_manager import DataManager
+from metrics import metrics
 
 from PySide6.QtCore import (
-    Qt, QObject, Signal, QRunnable, QThreadPool, Slot, QSize
+    Qt, QObject, Signal, QRunnable, QThreadPool, Slot, QSize, QEvent,
+    QAbstractListModel, QModelIndex, QRect, QRectF, QTimer
+)
+from PySide6.QtGui import (
+    QColor, QFont, QFontDatabase, QFontMetrics, QKeySequence, QPainter, QPen, QPixmap, QShortcut
 )
-from PySide6.QtGui import QColor
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QListWidget, QListWidgetItem,
+    QPushButton, QLabel, QListWidget, QListWidgetItem, QListView,
     QDialog, QLineEdit, QTextEdit, QDialogButtonBox, QFormLayout,
-    QMessageBox, QFrame, QSplitter
+    QMessageBox, QFrame, QSplitter, QStyledItemDelegate, QStyle, QCheckBox, QComboBox
 )
 
 # --- ESTILO DE LA APLICACIÓN (TEMA OSCURO) ---
@@ -58,6 +65,12 @@ STYLE_SHEET = """
     #sidebar QListWidget::item:selected, #sidebar QListWidget::item:hover {
         background-color: #4c566a;
     }
+    #sidebar QLineEdit#searchEdit {
+        margin: 0px 5px;
+    }
+    #sidebar QListWidget#searchResults::item {
+        padding: 6px 10px;
+    }
 
     /* --- Botones --- */
     QPushButton {
@@ -94,46 +107,10 @@ STYLE_SHEET = """
         font-size: 12pt; font-weight: bold; padding: 8px; color: #88c0d0;
         background-color: #434c5e; border-top-left-radius: 8px; border-top-right-radius: 8px;
     }
-    QListWidget#cardList {
+    /* Las tarjetas las pinta CardDelegate; la vista solo aporta el fondo */
+    QListView#cardList {
         background-color: transparent; border: none;
     }
-    /* This is important for custom widgets to be sized correctly */
-    QListWidget#cardList::item {
-        border: none;
-        padding: 0px;
-        margin: 0px;
-        background-color: transparent;
-    }
-
-    /* --- Widget de Tarjeta Personalizado --- */
-    #CardWidget {
-        background-color: #434c5e;
-        border-radius: 4px;
-        margin: 4px;
-        border: 1px solid #4c566a;
-    }
-    #CardWidget:hover {
-        border: 1px solid #5e81ac;
-    }
-    QLabel#cardTitle {
-        font-weight: bold;
-        font-size: 11pt;
-    }
-    QLabel#cardDueDate {
-        font-size: 8pt;
-        color: #b48ead;
-    }
-    QLabel#cardDueDate.overdue {
-        color: #bf616a;
-        font-weight: bold;
-    }
-    QLabel.cardLabel {
-        font-size: 8pt;
-        padding: 2px 6px;
-        border-radius: 6px;
-        color: #2e3440;
-        font-weight: bold;
-    }
 """
 
 
@@ -142,6 +119,7 @@ class WorkerSignals(QObject):
     finished = Signal()
     error = Signal(tuple)
     result = Signal(object)
+    progress = Signal(object)
 
 
 class Worker(QRunnable):
@@ -151,70 +129,407 @@ class Worker(QRunnable):
         self.args = args;
         self.kwargs = kwargs
         self.signals = WorkerSignals()
+        # Nombre de la tarea en las métricas
+        self.name = getattr(fn, '__name__', 'worker')
+        self.created_at = time.perf_counter()
+        self.cancelled = False
+        # El worker vive mientras KanbanApp guarde una referencia (active_workers/keyed_workers):
+        # con autoDelete el pool destruiría el objeto C++ al terminar y tryTake fallaría después
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        """Marca la tarea como cancelada: si aún no ha empezado ya no se ejecuta."""
+        self.cancelled = True
 
     @Slot()
     def run(self):
+        start = time.perf_counter()
+        outcome = 'ok'
+        metrics.observe('worker_queue_wait_seconds', start - self.created_at, task=self.name)
+        if self.cancelled:
+            metrics.increment('worker_cancelled', task=self.name, stage='queued')
+            self.signals.finished.emit()
+            return
         try:
             result = self.fn(*self.args, **self.kwargs)
         except Exception as e:
+            outcome = 'error'
             self.signals.error.emit((type(e), e, traceback.format_exc()))
         else:
             self.signals.result.emit(result)
         finally:
+            metrics.observe('worker_task_seconds', time.perf_counter() - start, task=self.name, outcome=outcome)
             self.signals.finished.emit()
 
 
-# --- WIDGET PERSONALIZADO PARA TARJETAS ---
-class CardWidget(QWidget):
-    def __init__(self, card_data):
-        super().__init__()
-        self.setObjectName("CardWidget")
-
-        self._main_layout = QVBoxLayout(self)
-        self._main_layout.setContentsMargins(10, 10, 10, 10)
-        self._main_layout.setSpacing(6)
-
-        self._title_label = QLabel(card_data['title'])
-        self._title_label.setObjectName("cardTitle")
-        self._title_label.setWordWrap(True)
-        self._main_layout.addWidget(self._title_label)
-
-        self._labels_layout = QHBoxLayout()
-        self._labels_layout.setSpacing(5)
-        self._label_widgets = []
-        labels_json = card_data.get('labels_json')
-        if labels_json:
-            labels = json.loads(labels_json)
-            for label_data in labels:
-                label_widget = QLabel(label_data['title'])
-                label_widget.setObjectName("cardLabel")
-                bg_color = f"#{label_data.get('color', 'CCCCCC').lstrip('#'):.6}"
-                label_widget.setStyleSheet(f"background-color: {bg_color};")
-                self._labels_layout.addWidget(label_widget)
-                self._label_widgets.append(label_widget)
-        self._labels_layout.addStretch()
-        self._main_layout.addLayout(self._labels_layout)
-
-        self._duedate_label = None
-        duedate_str = card_data.get('duedate')
-        if duedate_str:
-            self._duedate_label = self.format_duedate(duedate_str)
-            if self._duedate_label:
-                self._main_layout.addWidget(self._duedate_label)
+# --- SINCRONIZACIÓN EN SEGUNDO PLANO ---
+class SyncScheduler(QObject):
+    """
+    Sincroniza periódicamente en un worker: compacta y reenvía la cola offline y refresca
+    todos los tableros. El intervalo se duplica (hasta max_interval) mientras no cambia nada y
+    vuelve a min_interval cuando hay cambios o ediciones locales; se le aplica un jitter
+    aleatorio para que los clientes no coincidan. Se pausa con la ventana minimizada o tras
+    idle_timeout segundos sin actividad del usuario, y nunca lanza dos sincronizaciones a la vez.
+    """
+    progress = Signal(object)
+    # (peticiones ahorradas, cambios reenviados, {board_id: cambios}) o None si falló
+    synced = Signal(object)
+    USER_ACTIVITY_EVENTS = (QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.MouseMove, QEvent.Wheel)
+
+    def __init__(self, window, data_manager, run_worker, min_interval=15.0, max_interval=600.0,
+                 idle_timeout=300.0, jitter=0.2):
+        super().__init__(window)
+        self.window = window
+        self.data_manager = data_manager
+        self.run_worker = run_worker
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_timeout = idle_timeout
+        self.jitter = jitter
+        self.interval = min_interval
+        self.running = False
+        self.paused = False
+        self._changed = False
+        self._active = False
+        self._rerun = False
+        self._last_activity = time.monotonic()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.tick)
+        # Filtro de eventos de toda la aplicación para detectar actividad y minimizado
+        QApplication.instance().installEventFilter(self)
+
+    def start(self):
+        self._active = True
+        self.sync_now()
+
+    def stop(self):
+        self._active = False
+        self.timer.stop()
+
+    def notify_local_change(self):
+        """Tras una edición local se vuelve al intervalo mínimo para subirla pronto."""
+        self.interval = self.min_interval
+        if self._active and not self.running and (
+                not self.timer.isActive() or self.timer.remainingTime() > self.min_interval * 1000):
+            self._schedule(self.min_interval)
+
+    def sync_now(self):
+        if self.running:
+            # Se repite en cuanto termine la actual, en lugar de lanzar otra en paralelo
+            self._rerun = True
+            return
+        self.timer.stop()
+        self.running = True
+        self._changed = False
+        self.run_worker(self._sync, self._on_result, "Error en la sincronización en segundo plano",
+                        on_finish=self._on_finish, on_progress=self.progress.emit)
+
+    def _sync(self, progress_callback):
+        saved = self.data_manager.compact_offline_changes()
+        synced = self.data_manager.sync_offline_changes(
+            progress_callback=lambda done, total: progress_callback((done, total)))
+        return saved, synced, self.data_manager.refresh_all_boards()
+
+    def _on_result(self, result):
+        saved, synced, board_changes = result
+        self._changed = bool(synced) or any(ids for changes in board_changes.values()
+                                            for table in changes.values() for ids in table.values())
+        self.synced.emit(result)
+
+    def _on_finish(self):
+        self.running = False
+        if self._changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * 2)
+        if self._rerun:
+            self._rerun = False
+            self._schedule(0)
+        else:
+            self._schedule(self.interval)
 
-    def format_duedate(self, duedate_str):
-        try:
-            dt_obj = datetime.fromisoformat(duedate_str.replace('Z', '+00:00'))
-            is_overdue = dt_obj < datetime.now(timezone.utc)
-            meses = ["ene", "feb", "mar", "abr", "may", "jun", "jul", "ago", "sep", "oct", "nov", "dic"]
-            formatted_date = f"Vence: {dt_obj.day} {meses[dt_obj.month - 1]} {dt_obj.year}"
-            label = QLabel(formatted_date)
-            label.setObjectName("cardDueDate")
-            if is_overdue:
-                label.setProperty("class", "overdue")
-            return label
-        except (ValueError, TypeError):
+    def _schedule(self, seconds):
+        if not self._active:
+            return
+        seconds *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.timer.start(int(seconds * 1000))
+
+    def _should_pause(self):
+        return self.window.isMinimized() or time.monotonic() - self._last_activity > self.idle_timeout
+
+    def tick(self):
+        if self._should_pause():
+            # No se reprograma: se reanuda con la siguiente actividad del usuario
+            self.paused = True
+            return
+        self.sync_now()
+
+    def eventFilter(self, obj, event):
+        event_type = event.type()
+        if event_type in self.USER_ACTIVITY_EVENTS or (obj is self.window and event_type == QEvent.WindowStateChange):
+            self._last_activity = time.monotonic()
+            if self.paused and not self._should_pause():
+                self.paused = False
+                self.sync_now()
+        return False
+
+
+# --- MODELO Y DELEGADO PARA TARJETAS ---
+MESES = ["ene", "feb", "mar", "abr", "may", "jun", "jul", "ago", "sep", "oct", "nov", "dic"]
+
+
+def format_duedate(duedate_str, due_at=None):
+    """
+    Devuelve (texto, vencida) para una fecha límite ISO, o None si no se puede interpretar.
+    due_at es la misma fecha en segundos UTC, ya precalculada en la base de datos.
+    """
+    try:
+        dt_obj = datetime.fromisoformat(duedate_str.replace('Z', '+00:00'))
+        is_overdue = due_at < time.time() if due_at is not None else dt_obj < datetime.now(timezone.utc)
+        return f"Vence: {dt_obj.day} {MESES[dt_obj.month - 1]} {dt_obj.year}", is_overdue
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def parse_labels(labels_json):
+    """
+    Interpreta el labels_json de una tarjeta como una tupla de (título, color '#rrggbb').
+    Muchas tarjetas comparten exactamente el mismo conjunto de etiquetas, así que se cachea.
+    """
+    if not labels_json:
+        return ()
+    try:
+        return tuple((label['title'], f"#{(label.get('color') or 'CCCCCC').lstrip('#'):.6}")
+                     for label in json.loads(labels_json))
+    except (ValueError, TypeError, KeyError):
+        return ()
+
+
+class CardListModel(QAbstractListModel):
+    """
+    Modelo de las tarjetas de una pila. Qt.UserRole devuelve el diccionario de la tarjeta y
+    CardRenderRole los datos ya preparados para pintarla (etiquetas y fecha interpretadas una sola vez).
+    """
+    CardRenderRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cards = []
+        self._render_cache = []
+
+    def set_cards(self, cards):
+        self.beginResetModel()
+        self._cards = list(cards or [])
+        self._render_cache = [None] * len(self._cards)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._cards)
+
+    def row_of(self, card_id):
+        for row, card in enumerate(self._cards):
+            if card['id'] == card_id:
+                return row
+        return -1
+
+    @staticmethod
+    def _sort_key(card):
+        # Mismo orden que la base de datos: "order" (los NULL primero) y después id
+        return card.get('order') is not None, card.get('order') or 0, card['id']
+
+    def upsert_card(self, card, previous_id=None):
+        """
+        Sustituye los datos de una tarjeta ya mostrada (buscándola por previous_id si su id ha
+        cambiado, p. ej. al confirmarse un id temporal) o la inserta en su posición si no está.
+        """
+        row = self.row_of(card['id'])
+        if previous_id is not None and previous_id != card['id']:
+            previous_row = self.row_of(previous_id)
+            if previous_row >= 0:
+                # Si la tarjeta con el id definitivo ya había llegado (p. ej. en un refresco) se
+                # descarta esa fila y se conserva la del id temporal, para no mostrarla dos veces
+                if row >= 0:
+                    self.remove_row(row)
+                    previous_row = self.row_of(previous_id)
+                row = previous_row
+        if row >= 0 and self._sort_key(self._cards[row]) == self._sort_key(card):
+            self._cards[row] = card
+            self._render_cache[row] = None
+            # layoutChanged en lugar de dataChanged: la altura de la tarjeta puede haber cambiado
+            self.layoutAboutToBeChanged.emit()
+            self.layoutChanged.emit()
+            return
+        if row >= 0:
+            self.remove_row(row)
+        key = self._sort_key(card)
+        row = next((i for i, other in enumerate(self._cards) if self._sort_key(other) > key), len(self._cards))
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._cards.insert(row, card)
+        self._render_cache.insert(row, None)
+        self.endInsertRows()
+
+    def remove_card(self, card_id):
+        row = self.row_of(card_id)
+        if row >= 0:
+            self.remove_row(row)
+        return row >= 0
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._cards[row]
+        del self._render_cache[row]
+        self.endRemoveRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._cards):
             return None
+        card = self._cards[index.row()]
+        if role == Qt.DisplayRole:
+            return card['title']
+        if role == Qt.UserRole:
+            return card
+        if role == self.CardRenderRole:
+            if self._render_cache[index.row()] is None:
+                self._render_cache[index.row()] = self._prepare(card)
+            return self._render_cache[index.row()]
+        return None
+
+    @staticmethod
+    def _prepare(card):
+        labels = parse_labels(card.get('labels_json'))
+        duedate = format_duedate(card['duedate'], card.get('due_at')) if card.get('duedate') else None
+        return card['title'], labels, duedate
+
+
+class CardDelegate(QStyledItemDelegate):
+    """Pinta cada tarjeta directamente (título, etiquetas y fecha límite) sin crear widgets."""
+    MARGIN = 4
+    PADDING = 10
+    SPACING = 6
+    LABEL_SPACING = 5
+    BACKGROUND = QColor("#434c5e")
+    BORDER = QColor("#4c566a")
+    BORDER_HOVER = QColor("#5e81ac")
+    LABEL_TEXT = QColor("#2e3440")
+    DUEDATE = QColor("#b48ead")
+    DUEDATE_OVERDUE = QColor("#bf616a")
+    # Máximo de etiquetas pre-renderizadas que se guardan en memoria
+    PILL_CACHE_SIZE = 512
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._font_cache = {}
+        self._pill_cache = OrderedDict()
+
+    def _fonts(self, option):
+        key = option.font.key()
+        if key not in self._font_cache:
+            self._font_cache[key] = self._build_fonts(option.font)
+        return self._font_cache[key]
+
+    @staticmethod
+    def _build_fonts(base_font):
+        title_font = QFont(base_font)
+        title_font.setPointSize(11)
+        title_font.setBold(True)
+        small_font = QFont(base_font)
+        small_font.setPointSize(8)
+        small_bold_font = QFont(small_font)
+        small_bold_font.setBold(True)
+        return title_font, small_font, small_bold_font
+
+    def _label_pill(self, text, color, font, device_pixel_ratio):
+        """Devuelve la etiqueta ya pintada en un QPixmap, reutilizándola entre tarjetas y repintados."""
+        key = (text, color, font.key(), device_pixel_ratio)
+        pixmap = self._pill_cache.get(key)
+        if pixmap is not None:
+            self._pill_cache.move_to_end(key)
+            return pixmap
+        label_metrics = QFontMetrics(font)
+        width, height = label_metrics.horizontalAdvance(text) + 12, label_metrics.height() + 4
+        pixmap = QPixmap(round(width * device_pixel_ratio), round(height * device_pixel_ratio))
+        pixmap.setDevicePixelRatio(device_pixel_ratio)
+        pixmap.fill(Qt.transparent)
+        pill_painter = QPainter(pixmap)
+        pill_painter.setRenderHint(QPainter.Antialiasing)
+        pill_painter.setPen(Qt.NoPen)
+        pill_painter.setBrush(QColor(color))
+        pill_painter.drawRoundedRect(QRectF(0, 0, width, height), 6, 6)
+        pill_painter.setFont(font)
+        pill_painter.setPen(self.LABEL_TEXT)
+        pill_painter.drawText(QRect(0, 0, width, height), Qt.AlignCenter, text)
+        pill_painter.end()
+        self._pill_cache[key] = pixmap
+        if len(self._pill_cache) > self.PILL_CACHE_SIZE:
+            self._pill_cache.popitem(last=False)
+        return pixmap
+
+    def _content_width(self, option):
+        width = option.rect.width()
+        if option.widget is not None:
+            width = option.widget.viewport().width()
+        return max(50, width - 2 * (self.MARGIN + self.PADDING))
+
+    def _title_height(self, title_font, title, width):
+        return QFontMetrics(title_font).boundingRect(QRect(0, 0, width, 100000), Qt.TextWordWrap, title).height()
+
+    def sizeHint(self, option, index):
+        title, labels, duedate = index.data(CardListModel.CardRenderRole)
+        title_font, small_font, small_bold_font = self._fonts(option)
+        width = self._content_width(option)
+        height = self._title_height(title_font, title, width)
+        # La fila de etiquetas siempre añade su espaciado, aunque esté vacía
+        height += self.SPACING
+        if labels:
+            height += QFontMetrics(small_bold_font).height() + 4 + self.SPACING
+        if duedate:
+            height += self.SPACING + QFontMetrics(small_font).height()
+        return QSize(width + 2 * (self.MARGIN + self.PADDING), height + 2 * (self.MARGIN + self.PADDING))
+
+    def paint(self, painter, option, index):
+        title, labels, duedate = index.data(CardListModel.CardRenderRole)
+        title_font, small_font, small_bold_font = self._fonts(option)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        card_rect = QRectF(option.rect).adjusted(self.MARGIN + 0.5, self.MARGIN + 0.5,
+                                                 -self.MARGIN - 0.5, -self.MARGIN - 0.5)
+        highlighted = option.state & (QStyle.State_MouseOver | QStyle.State_Selected)
+        painter.setPen(QPen(self.BORDER_HOVER if highlighted else self.BORDER, 1))
+        painter.setBrush(self.BACKGROUND)
+        painter.drawRoundedRect(card_rect, 4, 4)
+
+        x = option.rect.x() + self.MARGIN + self.PADDING
+        y = option.rect.y() + self.MARGIN + self.PADDING
+        width = self._content_width(option)
+
+        painter.setFont(title_font)
+        painter.setPen(option.palette.color(option.palette.ColorRole.WindowText))
+        title_height = self._title_height(title_font, title, width)
+        painter.drawText(QRect(x, y, width, title_height), Qt.TextWordWrap, title)
+        y += title_height + self.SPACING
+
+        pill_height = QFontMetrics(small_bold_font).height() + 4
+        device_pixel_ratio = painter.device().devicePixelRatioF()
+        label_x = x
+        for text, color in labels:
+            pill = self._label_pill(text, color, small_bold_font, device_pixel_ratio)
+            pill_width = round(pill.width() / device_pixel_ratio)
+            if label_x + pill_width > x + width:
+                break
+            painter.drawPixmap(label_x, y, pill)
+            label_x += pill_width + self.LABEL_SPACING
+        y += (pill_height + self.SPACING) if labels else 0
+
+        if duedate:
+            text, is_overdue = duedate
+            painter.setFont(small_bold_font if is_overdue else small_font)
+            painter.setPen(self.DUEDATE_OVERDUE if is_overdue else self.DUEDATE)
+            painter.drawText(QRect(x, y, width, QFontMetrics(small_font).height()), Qt.AlignLeft, text)
+
+        painter.restore()
 
 
 # --- DIÁLOGOS ---
@@ -240,13 +555,24 @@ class LoginDialog(QDialog):
 
 
 class CardEditDialog(QDialog):
+    """
+    Edición de una tarjeta. card_data es la tarjeta de la lista, sin descripción: la descripción
+    llega después con set_detail() y, hasta entonces, no se puede editar ni se envía al guardar.
+    """
+
     def __init__(self, card_data, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Editar Tarjeta")
         self.setMinimumWidth(400)
 
         self.title_edit = QLineEdit(card_data.get('title', ''))
-        self.description_edit = QTextEdit(card_data.get('description', ''))
+        self.description_edit = QTextEdit()
+        self.description_loaded = 'description' in card_data
+        if self.description_loaded:
+            self.description_edit.setPlainText(card_data['description'] or '')
+        else:
+            self.description_edit.setEnabled(False)
+            self.description_edit.setPlaceholderText("Cargando descripción...")
 
         self.duedate_edit = QDateEdit()
         self.duedate_edit.setCalendarPopup(True)
@@ -261,10 +587,9 @@ class CardEditDialog(QDialog):
         self.labels_edit = QLineEdit()
         self.labels_edit.setReadOnly(True)
         self.labels_edit.setPlaceholderText("La edición de etiquetas no está implementada")
-        labels_json = card_data.get('labels_json')
-        if labels_json:
-            labels = json.loads(labels_json)
-            self.labels_edit.setText(", ".join([l['title'] for l in labels]))
+        labels = parse_labels(card_data.get('labels_json'))
+        if labels:
+            self.labels_edit.setText(", ".join(title for title, _ in labels))
 
         buttons = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Cancel)
         buttons.accepted.connect(self.accept);
@@ -279,11 +604,20 @@ class CardEditDialog(QDialog):
         layout.addLayout(form_layout)
         layout.addWidget(buttons)
 
+    def set_detail(self, card_detail):
+        """Muestra la descripción de la tarjeta completa (get_card_detail)."""
+        if self.description_loaded or not card_detail:
+            return
+        self.description_loaded = True
+        self.description_edit.setPlainText(card_detail.get('description') or '')
+        self.description_edit.setPlaceholderText("")
+        self.description_edit.setEnabled(True)
+
     def get_updated_data(self):
-        data = {
-            "title": self.title_edit.text(),
-            "description": self.description_edit.toPlainText()
-        }
+        data = {"title": self.title_edit.text()}
+        # Sin la descripción cargada se enviaría vacía y borraría la del servidor
+        if self.description_loaded:
+            data["description"] = self.description_edit.toPlainText()
 
         q_date = self.duedate_edit.date()
         dt_obj = datetime(q_date.year(), q_date.month(), q_date.day(), 12, 0, 0, tzinfo=timezone.utc)
@@ -292,6 +626,118 @@ class CardEditDialog(QDialog):
         return data
 
 
+class MetricsDialog(QDialog):
+    """Panel de depuración con las métricas de API, base de datos, workers y pintado."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Métricas de rendimiento")
+        self.resize(800, 600)
+        self.enabled_check = QCheckBox("Registrar métricas")
+        self.enabled_check.setChecked(metrics.enabled)
+        self.enabled_check.toggled.connect(lambda on: metrics.enable() if on else metrics.disable())
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(["JSON", "Prometheus"])
+        self.format_combo.currentIndexChanged.connect(self.refresh)
+        refresh_button = QPushButton("Actualizar");
+        refresh_button.clicked.connect(self.refresh)
+        reset_button = QPushButton("Reiniciar");
+        reset_button.clicked.connect(lambda: (metrics.reset(), self.refresh()))
+        self.text = QTextEdit();
+        self.text.setReadOnly(True)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.enabled_check);
+        controls.addStretch()
+        controls.addWidget(self.format_combo);
+        controls.addWidget(refresh_button);
+        controls.addWidget(reset_button)
+        layout = QVBoxLayout(self)
+        layout.addLayout(controls)
+        layout.addWidget(self.text)
+        self.refresh()
+
+    def refresh(self):
+        if self.format_combo.currentText() == "Prometheus":
+            self.text.setPlainText(metrics.to_prometheus())
+        else:
+            self.text.setPlainText(json.dumps(metrics.to_json(), indent=2, ensure_ascii=False))
+
+
+class AgendaDialog(QDialog):
+    """
+    Agenda de vencimientos de todos los tableros (vencidas o próximas), leída de la caché local
+    página a página. Al activar una tarjeta se emite card_selected con sus datos.
+    """
+    PAGE_SIZE = 50
+    # (texto, días hacia delante; None = vencidas)
+    VIEWS = [("Vencidas", None), ("Próximos 7 días", 7), ("Próximos 30 días", 30)]
+    card_selected = Signal(dict)
+
+    def __init__(self, data_manager, run_worker, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Agenda")
+        self.resize(500, 600)
+        self.data_manager = data_manager
+        self.run_worker = run_worker
+        self._after = None
+        # Aumenta al cambiar de vista: las páginas que lleguen de una vista anterior se descartan
+        self._generation = 0
+
+        self.view_combo = QComboBox()
+        self.view_combo.addItems([text for text, _ in self.VIEWS])
+        self.view_combo.currentIndexChanged.connect(self.reload)
+        self.list_widget = QListWidget()
+        self.list_widget.setWordWrap(True)
+        self.list_widget.itemActivated.connect(self.handle_activation)
+        self.more_button = QPushButton("Cargar más")
+        self.more_button.clicked.connect(self.load_page)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.view_combo)
+        layout.addWidget(self.list_widget)
+        layout.addWidget(self.more_button)
+        self.reload()
+
+    def reload(self):
+        self._generation += 1
+        self._after = None
+        self.list_widget.clear()
+        self.load_page()
+
+    def load_page(self):
+        self.more_button.setEnabled(False)
+        generation, after = self._generation, self._after
+        days = self.VIEWS[self.view_combo.currentIndex()][1]
+        if days is None:
+            fetch = lambda: self.data_manager.get_overdue_cards(self.PAGE_SIZE, after)
+        else:
+            fetch = lambda: self.data_manager.get_cards_due_within(days, self.PAGE_SIZE, after)
+        self.run_worker(fetch, lambda cards: self.append_page(generation, cards), "Error al cargar la agenda",
+                        on_finish=lambda: None)
+
+    def append_page(self, generation, cards):
+        if generation != self._generation:
+            return
+        for card in cards:
+            duedate = format_duedate(card['duedate'], card['due_at'])
+            board = card.get('board_title') or f"Tablero {card['board_id']}"
+            item = QListWidgetItem(f"{card['title']}\n{board} › {card.get('stack_title') or ''}"
+                                   f"{' · ' + duedate[0] if duedate else ''}")
+            item.setData(Qt.UserRole, card)
+            if duedate and duedate[1]:
+                item.setForeground(CardDelegate.DUEDATE_OVERDUE)
+            self.list_widget.addItem(item)
+        if cards:
+            self._after = (cards[-1]['due_at'], cards[-1]['id'])
+        self.more_button.setEnabled(len(cards) == self.PAGE_SIZE)
+
+    def handle_activation(self, item):
+        self.card_selected.emit(item.data(Qt.UserRole))
+        self.accept()
+
+
 class GenericCreateDialog(QDialog):
     def __init__(self, title, labels, parent=None):
         super().__init__(parent)
@@ -310,15 +756,30 @@ class GenericCreateDialog(QDialog):
 
 # --- VENTANA PRINCIPAL ---
 class KanbanApp(QMainWindow):
+    # Eventos de cambio de DataManager (board_id, eventos), entregados en el hilo de la GUI
+    data_changed = Signal(object, object)
+    # A partir de este número de eventos se vuelve a pintar el tablero entero desde la caché local
+    MAX_PATCH_EVENTS = 300
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Visor de Kanban para Nextcloud Deck");
         self.setGeometry(100, 100, 1400, 900)
         self.setStyleSheet(STYLE_SHEET)
         self.data_manager = DataManager()
+        self.data_changed.connect(self.apply_data_changes)
+        self.data_manager.add_change_listener(self.data_changed.emit)
         self.current_board_id = None
+        # Columnas y modelos de tarjetas del tablero mostrado, por id de pila
+        self.stack_frames = {}
+        self.card_models = {}
         self.threadpool = QThreadPool()
         self.active_workers = set()
+        # Última petición en curso y generación actual de cada key (ver run_worker)
+        self.keyed_workers = {}
+        self.worker_generations = {}
+        # True mientras se espera la respuesta del inicio de sesión automático
+        self.login_pending = False
 
         self.splitter = QSplitter(Qt.Horizontal);
         self.setCentralWidget(self.splitter)
@@ -328,13 +789,34 @@ class KanbanApp(QMainWindow):
         sidebar_layout.setContentsMargins(0, 0, 0, 0);
         sidebar_layout.setSpacing(5)
         sidebar_header = QLabel("Tableros")
+        self.search_edit = QLineEdit();
+        self.search_edit.setObjectName("searchEdit")
+        self.search_edit.setPlaceholderText("Buscar tarjetas...")
+        self.search_edit.setClearButtonEnabled(True)
+        # Se espera a que el usuario deje de escribir antes de lanzar la búsqueda
+        self.search_timer = QTimer(self);
+        self.search_timer.setSingleShot(True);
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.search_cards)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        self.search_results_widget = QListWidget();
+        self.search_results_widget.setObjectName("searchResults")
+        self.search_results_widget.setWordWrap(True)
+        self.search_results_widget.itemClicked.connect(self.handle_search_result_selection)
+        self.search_results_widget.itemDoubleClicked.connect(self.edit_card)
+        self.search_results_widget.hide()
         self.board_list_widget = QListWidget();
         self.board_list_widget.itemClicked.connect(self.handle_board_selection)
+        agenda_button = QPushButton("Agenda");
+        agenda_button.clicked.connect(self.show_agenda)
         add_board_button = QPushButton("+ Añadir Tablero");
         add_board_button.setObjectName("addButton");
         add_board_button.clicked.connect(self.add_new_board)
         sidebar_layout.addWidget(sidebar_header);
+        sidebar_layout.addWidget(self.search_edit);
+        sidebar_layout.addWidget(self.search_results_widget);
         sidebar_layout.addWidget(self.board_list_widget);
+        sidebar_layout.addWidget(agenda_button);
         sidebar_layout.addWidget(add_board_button)
 
         self.board_area = QWidget();
@@ -344,32 +826,99 @@ class KanbanApp(QMainWindow):
         self.splitter.addWidget(self.board_area);
         self.splitter.setSizes([250, 1150])
 
+        # Panel de métricas de depuración
+        QShortcut(QKeySequence("Ctrl+Shift+M"), self, activated=self.show_metrics)
+
         self.status_label = QLabel("Inicializando...");
         self.statusBar().addPermanentWidget(self.status_label)
+        self.sync_scheduler = SyncScheduler(self, self.data_manager, self.run_worker)
+        self.sync_scheduler.progress.connect(self.show_sync_progress)
+        self.sync_scheduler.synced.connect(self.handle_background_sync)
         self.show()
         self.init_app()
 
-    def run_worker(self, fn, on_success, on_error_msg, on_finish=None):
+    def run_worker(self, fn, on_success, on_error_msg, on_finish=None, on_progress=None, key=None, token=None):
+        """
+        Ejecuta fn en el QThreadPool y entrega el resultado en el hilo de la GUI.
+        key identifica el destino de la petición (p. ej. 'board'): una petición nueva con la misma
+        key reemplaza a la anterior, que se cancela si aún no ha empezado y cuyo resultado se
+        descarta si ya estaba en marcha. Si la petición en curso tiene además el mismo token
+        (p. ej. el id del tablero) no se lanza otra: se fusionan y su resultado va a los nuevos callbacks.
+        """
+        if key is not None:
+            current = self.keyed_workers.get(key)
+            if current is not None and token is not None and current.token == token:
+                current.callbacks = (on_success, on_error_msg, on_finish)
+                metrics.increment('worker_coalesced', task=current.name)
+                return current
+            if current is not None:
+                self.cancel_worker(current)
+            self.worker_generations[key] = self.worker_generations.get(key, 0) + 1
+
         worker = Worker(fn)
-        worker.signals.result.connect(on_success)
-        worker.signals.error.connect(lambda err: self.show_error(f"{on_error_msg}: {err[1]}"))
+        if worker.name == '<lambda>':
+            # Las lambdas no tienen nombre útil: se identifica la tarea por su mensaje de error
+            worker.name = on_error_msg
+        worker.key, worker.token = key, token
+        worker.generation = self.worker_generations.get(key)
+        worker.callbacks = (on_success, on_error_msg, on_finish)
+
+        def is_current():
+            return not worker.cancelled and (key is None or worker.generation == self.worker_generations.get(key))
+
+        if on_progress:
+            # La función recibe un callback que emite la señal de progreso hacia el hilo de la GUI
+            worker.kwargs['progress_callback'] = worker.signals.progress.emit
+            worker.signals.progress.connect(lambda progress: on_progress(progress) if is_current() else None)
+
+        def handle_result(result):
+            if is_current():
+                worker.callbacks[0](result)
+            else:
+                metrics.increment('worker_stale_results', task=worker.name)
+
+        def handle_error(err):
+            if is_current():
+                self.show_error(f"{worker.callbacks[1]}: {err[1]}")
 
         def cleanup():
             self.active_workers.discard(worker)
-            if on_finish:
-                on_finish()
+            if key is not None and self.keyed_workers.get(key) is worker:
+                del self.keyed_workers[key]
+            if not is_current():
+                return
+            if worker.callbacks[2]:
+                worker.callbacks[2]()
             else:
                 self.status_label.setText("Listo.")
 
+        worker.signals.result.connect(handle_result)
+        worker.signals.error.connect(handle_error)
         worker.signals.finished.connect(cleanup)
 
         self.active_workers.add(worker)
+        if key is not None:
+            self.keyed_workers[key] = worker
         self.threadpool.start(worker)
+        return worker
+
+    def cancel_worker(self, worker):
+        worker.cancel()
+        if self.keyed_workers.get(worker.key) is worker:
+            del self.keyed_workers[worker.key]
+        if self.threadpool.tryTake(worker):
+            # Se ha sacado de la cola antes de empezar: nunca emitirá finished
+            self.active_workers.discard(worker)
+            metrics.increment('worker_cancelled', task=worker.name, stage='dequeued')
 
     def init_app(self):
         creds = self.data_manager.load_credentials()
         if creds:
-            self.status_label.setText("Conectando automáticamente...")
+            # Primero se pinta lo que hay en la caché local; la conexión se verifica en segundo plano
+            self.status_label.setText("Cargando datos locales...")
+            self.run_worker(self.data_manager.get_cached_snapshot, self.display_cached_snapshot,
+                            "Error al cargar los datos locales", on_finish=lambda: None)
+            self.login_pending = True
             self.run_worker(lambda: self.data_manager.attempt_login(**creds), self.post_login_actions,
                             "Fallo al autoconectar")
         else:
@@ -386,24 +935,57 @@ class KanbanApp(QMainWindow):
         else:
             self.close()
 
+    def display_cached_snapshot(self, snapshot):
+        boards, last_board_id, board_data = snapshot
+        # Si la conexión ya respondió y se ha abierto un tablero, no se pisa con datos de la caché
+        if self.board_list_widget.count() == 0:
+            self.populate_board_list(boards)
+        if board_data is not None and self.current_board_id is None:
+            self.current_board_id = last_board_id
+            self.select_board_item(last_board_id)
+            self.display_board(board_data)
+        # Si la conexión respondió antes que la caché no se pisa su mensaje de estado
+        if self.login_pending:
+            self.status_label.setText("Conectando automáticamente...")
+
     def post_login_actions(self, success):
+        self.login_pending = False
         if success:
             self.status_label.setText("Conectado. Sincronizando...")
             self.load_boards()
-            self.sync_offline_changes()
+            self.sync_scheduler.start()
+            # Refresca con los datos del servidor el tablero que se mostró desde la caché;
+            # las diferencias llegan como eventos de cambio y se aplican sin reconstruirlo
+            if self.current_board_id is not None:
+                board_id = self.current_board_id
+                self.run_worker(lambda: self.data_manager.get_board(board_id), lambda board_data: None,
+                                "Error al actualizar el tablero")
         else:
             self.status_label.setText("[Offline] No se pudo conectar.")
             self.load_boards()
 
     def sync_offline_changes(self):
-        if not self.data_manager.is_online(): return
-        self.status_label.setText("Sincronizando cambios locales...")
-        on_success = lambda count: self.status_label.setText(f"{count} cambios locales sincronizados.")
-        self.run_worker(self.data_manager.sync_offline_changes, on_success, "Error al sincronizar cambios")
+        self.sync_scheduler.sync_now()
+
+    def show_sync_progress(self, progress):
+        done, total = progress
+        self.status_label.setText(f"Sincronizando cambios locales... {done}/{total}")
+
+    def handle_background_sync(self, result):
+        saved, count, board_changes = result
+        if count:
+            message = f"{count} cambios locales sincronizados."
+            if saved:
+                message += f" ({saved} peticiones redundantes evitadas)"
+            self.status_label.setText(message)
+        # El tablero abierto ya se ha actualizado con los eventos de cambio de DataManager
+        if any(ids for changes in board_changes.values() for table in changes.values() for ids in table.values()):
+            self.load_boards()
 
     def load_boards(self):
         self.status_label.setText("Cargando tableros...")
-        self.run_worker(self.data_manager.get_boards, self.populate_board_list, "Error al cargar tableros")
+        self.run_worker(self.data_manager.get_boards, self.populate_board_list, "Error al cargar tableros",
+                        key='boards')
 
     def populate_board_list(self, boards):
         self.board_list_widget.clear()
@@ -411,26 +993,73 @@ class KanbanApp(QMainWindow):
             item = QListWidgetItem(board['title']);
             item.setData(Qt.UserRole, board['id'])
             self.board_list_widget.addItem(item)
+        self.select_board_item(self.current_board_id)
         self.status_label.setText(f"{len(boards)} tableros cargados.")
 
+    def select_board_item(self, board_id):
+        for row in range(self.board_list_widget.count()):
+            item = self.board_list_widget.item(row)
+            if item.data(Qt.UserRole) == board_id:
+                self.board_list_widget.setCurrentItem(item)
+                return
+
     def handle_board_selection(self, item):
         board_id = item.data(Qt.UserRole);
         self.load_board(board_id)
 
+    def search_cards(self):
+        query = self.search_edit.text().strip()
+        if not query:
+            self.search_results_widget.clear()
+            self.search_results_widget.hide()
+            return
+
+        def on_results(results):
+            # Se descartan los resultados de búsquedas que ya no corresponden al texto actual
+            if query != self.search_edit.text().strip():
+                return
+            self.search_results_widget.clear()
+            for card in results:
+                item = QListWidgetItem(f"{card['title']}\n{card['snippet']}")
+                item.setData(Qt.UserRole, card)
+                self.search_results_widget.addItem(item)
+            self.search_results_widget.setVisible(True)
+            self.status_label.setText(f"{len(results)} tarjetas encontradas.")
+
+        self.run_worker(lambda: self.data_manager.search_cards(query), on_results, "Error al buscar tarjetas",
+                        on_finish=lambda: None, key='search', token=query)
+
+    def handle_search_result_selection(self, item):
+        self.open_card_board(item.data(Qt.UserRole))
+
+    def open_card_board(self, card):
+        if card['board_id'] != self.current_board_id:
+            self.select_board_item(card['board_id'])
+            self.load_board(card['board_id'])
+
     def load_board(self, board_id):
         self.current_board_id = board_id;
         self.status_label.setText(f"Cargando tablero ID: {board_id}...")
         self.clear_board_layout()
-        self.run_worker(lambda: self.data_manager.get_stacks(board_id), self.display_board, f"Error al cargar pilas")
 
-    def display_board(self, stacks):
-        for stack in stacks:
-            stack_widget = self.create_stack_widget(self.current_board_id, stack)
-            self.board_layout.addWidget(stack_widget)
-        self.add_new_stack_widget();
+        def load_board_data():
+            self.data_manager.set_last_board_id(board_id)
+            return self.data_manager.get_board(board_id)
+
+        # Al cambiar de tablero rápidamente solo se pinta el último; los anteriores se cancelan o descartan
+        self.run_worker(load_board_data, self.display_board, f"Error al cargar pilas", key='board', token=board_id)
+
+    def display_board(self, board_data):
+        stacks, cards_by_stack = board_data
+        with metrics.timer('board_render_seconds'):
+            for stack in stacks:
+                stack_widget = self.create_stack_widget(self.current_board_id, stack,
+                                                        cards_by_stack.get(stack['id'], []))
+                self.board_layout.addWidget(stack_widget)
+            self.add_new_stack_widget();
         self.status_label.setText("Tablero cargado.")
 
-    def create_stack_widget(self, board_id, stack):
+    def create_stack_widget(self, board_id, stack, cards):
         stack_frame = QFrame();
         stack_frame.setObjectName("stackFrame")
         layout = QVBoxLayout(stack_frame);
@@ -439,41 +1068,30 @@ class KanbanApp(QMainWindow):
         title_label.setObjectName("stackTitle")
         add_card_btn = QPushButton("+ Añadir Tarjeta");
         add_card_btn.setObjectName("addButton")
-        card_list_widget = QListWidget();
+        card_list_widget = QListView();
         card_list_widget.setObjectName("cardList")
-        card_list_widget.itemDoubleClicked.connect(self.edit_card)
-        add_card_btn.clicked.connect(partial(self.add_new_card, stack['id'], card_list_widget))
+        card_list_widget.setModel(CardListModel(card_list_widget))
+        card_list_widget.setItemDelegate(CardDelegate(card_list_widget))
+        card_list_widget.setResizeMode(QListView.Adjust)
+        card_list_widget.setVerticalScrollMode(QListView.ScrollPerPixel)
+        card_list_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        card_list_widget.setMouseTracking(True)
+        card_list_widget.doubleClicked.connect(self.edit_card)
+        # El id se lee al pulsar: el de una pila recién creada cambia cuando el servidor la confirma
+        stack_frame.setProperty('stack_id', stack['id'])
+        stack_frame.setProperty('order', stack.get('order'))
+        add_card_btn.clicked.connect(lambda: self.add_new_card(stack_frame.property('stack_id'), card_list_widget))
         layout.addWidget(title_label);
         layout.addWidget(add_card_btn);
         layout.addWidget(card_list_widget, 1)
-        self.refresh_cards_for_stack(board_id, stack['id'], card_list_widget)
+        self.populate_card_list(card_list_widget, cards)
+        self.stack_frames[stack['id']] = stack_frame
+        self.card_models[stack['id']] = card_list_widget.model()
         return stack_frame
 
-    def refresh_cards_for_stack(self, board_id, stack_id, list_widget):
-        self.status_label.setText(f"Pidiendo tarjetas para pila {stack_id}...")
-
-        def on_cards_loaded(cards):
-            self.status_label.setText(f"Mostrando {len(cards)} tarjetas...")
-            self.populate_card_list(list_widget, cards)
-
-        self.run_worker(
-            lambda: self.data_manager.get_cards(board_id, stack_id),
-            on_cards_loaded,
-            f"Error al cargar tarjetas para pila {stack_id}"
-        )
-
     def populate_card_list(self, list_widget, cards):
-        list_widget.clear()
-        if not cards:
-            return
-
-        for card_data in cards:
-            card_widget = CardWidget(card_data)
-            list_item = QListWidgetItem()
-            list_item.setData(Qt.UserRole, card_data)
-            list_item.setSizeHint(card_widget.sizeHint())
-            list_widget.addItem(list_item)
-            list_widget.setItemWidget(list_item, card_widget)
+        # Solo se pintan las filas visibles: el modelo guarda los datos y el delegado los dibuja
+        list_widget.model().set_cards(cards)
 
     def add_new_board(self):
         dialog = GenericCreateDialog("Crear Nuevo Tablero", ["Título:", "Color (hex):"], self)
@@ -488,6 +1106,7 @@ class KanbanApp(QMainWindow):
                 return
 
             self.status_label.setText("Creando tablero...")
+            self.sync_scheduler.notify_local_change()
             self.run_worker(lambda: self.data_manager.create_board(title, f"#{color.lstrip('#')}"),
                             lambda b: self.load_boards(), "Error al crear tablero")
 
@@ -512,8 +1131,11 @@ class KanbanApp(QMainWindow):
                 return
 
             self.status_label.setText("Creando lista...")
-            self.run_worker(lambda: self.data_manager.create_stack(self.current_board_id, title),
-                            lambda s: self.load_board(self.current_board_id), "Error al crear lista")
+            self.sync_scheduler.notify_local_change()
+            board_id = self.current_board_id
+            # La lista aparece con el evento stack_added, antes de que responda la API
+            self.run_worker(lambda: self.data_manager.create_stack(board_id, title), lambda stack: None,
+                            "Error al crear lista")
 
     def add_new_card(self, stack_id, card_list_widget):
         dialog = GenericCreateDialog("Crear Nueva Tarjeta", ["Título:"], self)
@@ -526,27 +1148,129 @@ class KanbanApp(QMainWindow):
                 return
 
             self.status_label.setText("Creando tarjeta...")
-            on_success = lambda c: self.refresh_cards_for_stack(self.current_board_id, stack_id, card_list_widget)
-            self.run_worker(lambda: self.data_manager.create_card(self.current_board_id, stack_id, title), on_success,
+            self.sync_scheduler.notify_local_change()
+            board_id = self.current_board_id
+            card_list_widget.scrollToBottom()
+            # La tarjeta aparece con el evento card_added; al responder la API solo cambia su id
+            self.run_worker(lambda: self.data_manager.create_card(board_id, stack_id, title), lambda card: None,
                             "Error al crear tarjeta")
 
-    def edit_card(self, item):
-        card_data = item.data(Qt.UserRole)
+    def edit_card(self, index):
+        card_data = index.data(Qt.UserRole)
         dialog = CardEditDialog(card_data, self)
+        card_id = card_data['id']
+        # La lista no guarda las descripciones: se leen al abrir la tarjeta
+        self.run_worker(lambda: self.data_manager.get_card_detail(card_id), dialog.set_detail,
+                        "Error al cargar la tarjeta", key='card_detail')
         if dialog.exec() == QDialog.Accepted:
             updated_data = dialog.get_updated_data()
             self.status_label.setText(f"Actualizando tarjeta '{card_data['title']}'...")
-            on_success = lambda card: self.load_board(self.current_board_id)
+            self.sync_scheduler.notify_local_change()
             self.run_worker(
                 lambda: self.data_manager.update_card(card_data['board_id'], card_data['stack_id'], card_data['id'],
                                                       **updated_data),
-                on_success, "Error al actualizar la tarjeta")
+                lambda result: None, "Error al actualizar la tarjeta")
+
+    def apply_data_changes(self, board_id, events):
+        """Aplica al tablero mostrado los eventos de cambio, tocando solo las filas y columnas afectadas."""
+        if board_id != self.current_board_id or not self.stack_frames:
+            return
+        if len(events) > self.MAX_PATCH_EVENTS:
+            # Cambios masivos (p. ej. la primera sincronización): es más barato volver a pintarlo
+            self.run_worker(lambda: self.data_manager.get_local_board(board_id), self.redisplay_board,
+                            "Error al cargar pilas", key='board', token=('local', board_id))
+            return
+        with metrics.timer('board_patch_seconds'):
+            self.board_area.setUpdatesEnabled(False)
+            try:
+                for event in events:
+                    event_type = event['type']
+                    if event_type in ('card_added', 'card_updated', 'card_moved'):
+                        self.patch_card(event['card'], event.get('previous_id'))
+                    elif event_type == 'card_removed':
+                        for model in self.card_models.values():
+                            if model.remove_card(event['card_id']):
+                                break
+                    elif event_type in ('stack_added', 'stack_updated'):
+                        self.patch_stack(event['stack'], event.get('previous_id'))
+                    elif event_type == 'stack_removed':
+                        self.remove_stack(event['stack_id'])
+            finally:
+                self.board_area.setUpdatesEnabled(True)
+
+    def redisplay_board(self, board_data):
+        self.clear_board_layout()
+        self.display_board(board_data)
+
+    def patch_card(self, card, previous_id=None):
+        """Refleja una tarjeta añadida, editada o movida en su pila, quitándola de la anterior si cambia."""
+        target = self.card_models.get(card['stack_id'])
+        for stack_id, model in self.card_models.items():
+            if model is target:
+                continue
+            if model.remove_card(card['id'] if previous_id is None else previous_id):
+                break
+        if target is not None:
+            target.upsert_card(card, previous_id)
+
+    def patch_stack(self, stack, previous_id=None):
+        """Añade una pila al tablero mostrado o actualiza su id, título y posición."""
+        if previous_id is not None and previous_id != stack['id'] and previous_id in self.stack_frames:
+            # La columna con el id definitivo puede existir ya (p. ej. de un refresco): se quita para no duplicarla
+            self.remove_stack(stack['id'])
+            frame = self.stack_frames.pop(previous_id)
+            frame.setProperty('stack_id', stack['id'])
+            self.stack_frames[stack['id']] = frame
+            self.card_models[stack['id']] = self.card_models.pop(previous_id)
+        frame = self.stack_frames.get(stack['id'])
+        if frame is None:
+            frame = self.create_stack_widget(self.current_board_id, stack, [])
+        else:
+            frame.findChild(QLabel, "stackTitle").setText(stack['title'])
+            frame.setProperty('order', stack.get('order'))
+            if self.board_layout.indexOf(frame) == self.stack_position(frame):
+                return
+            self.board_layout.removeWidget(frame)
+        self.board_layout.insertWidget(self.stack_position(frame), frame)
+
+    def stack_position(self, frame):
+        """Posición que le corresponde a una columna según el "order" de las pilas."""
+        def sort_key(other):
+            order = other.property('order')
+            return order is not None, order or 0, other.property('stack_id')
+
+        key = sort_key(frame)
+        return sum(1 for other in self.stack_frames.values() if other is not frame and sort_key(other) < key)
+
+    def remove_stack(self, stack_id):
+        frame = self.stack_frames.pop(stack_id, None)
+        self.card_models.pop(stack_id, None)
+        if frame is not None:
+            self.board_layout.removeWidget(frame)
+            frame.deleteLater()
 
     def clear_board_layout(self):
+        self.stack_frames.clear()
+        self.card_models.clear()
         while self.board_layout.count():
             child = self.board_layout.takeAt(0)
             if child.widget(): child.widget().deleteLater()
 
+    def show_agenda(self):
+        dialog = AgendaDialog(self.data_manager, self.run_worker, self)
+        dialog.card_selected.connect(self.open_card_board)
+        dialog.exec()
+
+    def show_metrics(self):
+        MetricsDialog(self).exec()
+
+    def closeEvent(self, event):
+        # Espera a que terminen los workers antes de cerrar las conexiones SQLite
+        self.sync_scheduler.stop()
+        self.threadpool.waitForDone()
+        self.data_manager.close()
+        super().closeEvent(event)
+
     def show_error(self, message):
         self.status_label.setText(f"Error: {message}")
         QMessageBox.critical(self, "Error", message)
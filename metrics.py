@@ -0,0 +1,140 @@
+"""
+Métricas opcionales de rendimiento (latencias y contadores) para la API, la base de datos y la GUI.
+
+Están desactivadas por defecto; se activan con la variable de entorno KANBAN_METRICS=1 o
+llamando a metrics.enable(). Se pueden exportar como JSON o en formato de texto de Prometheus.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites superiores (en segundos) de los buckets de los histogramas de latencia
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """Registro de histogramas y contadores identificados por nombre y etiquetas. Seguro entre hilos."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Mide la duración del bloque y la registra en el histograma name."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def to_json(self):
+        """Instantánea de todas las métricas como estructura serializable a JSON."""
+        with self._lock:
+            histograms = [{
+                'name': name,
+                'labels': dict(labels),
+                'count': h.count,
+                'sum': round(h.sum, 6),
+                'avg': round(h.sum / h.count, 6) if h.count else 0.0,
+                'max': round(h.max, 6),
+                'buckets': {('+Inf' if bound == float('inf') else str(bound)): count
+                            for bound, count in h.cumulative()},
+            } for (name, labels), h in sorted(self._histograms.items())]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {'enabled': self.enabled, 'histograms': histograms, 'counters': counters}
+
+    def to_prometheus(self):
+        """Exporta las métricas en el formato de texto de exposición de Prometheus."""
+        def format_labels(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in h.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', le)])} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {h.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}_total{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(enabled=os.environ.get('KANBAN_METRICS', '') not in ('', '0'))
@@ -0,0 +1,21 @@
+"""Fixtures compartidas: ventana KanbanApp sin conexión sobre una base de datos temporal."""
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pytest
+
+import kanban_app
+
+
+@pytest.fixture
+def app(qtbot, tmp_path, monkeypatch):
+    # DataManager abre kanban_data.db en el directorio actual; init_app pediría credenciales
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(kanban_app.KanbanApp, 'init_app', lambda self: None)
+    window = kanban_app.KanbanApp()
+    qtbot.addWidget(window)
+    yield window
+    window.sync_scheduler.stop()
+    window.threadpool.waitForDone()
+    window.data_manager.close()
@@ -0,0 +1,45 @@
+"""
+AsyncDeckAPIClient contra FakeDeckServer: limita las peticiones simultáneas, devuelve lo mismo
+que el cliente síncrono y comparte su pool de conexiones sin sustituirlo.
+"""
+import asyncio
+
+import pytest
+
+from deck_api_client import AsyncDeckAPIClient, DeckAPIClient
+from fake_deck_server import FakeDeckServer
+
+
+@pytest.fixture
+def server():
+    with FakeDeckServer(n_boards=9, n_stacks=2, n_cards=3, latency=0.05) as server:
+        yield server
+
+
+def test_concurrency_is_bounded(server):
+    client = DeckAPIClient(server.url, 'usuario', 'clave', verify=False)
+    async_client = AsyncDeckAPIClient(client, max_concurrency=3)
+
+    async def fetch_all():
+        return await asyncio.gather(*(async_client.get_stacks_with_cards(board_id) for board_id in range(1, 10)))
+
+    try:
+        results = asyncio.run(fetch_all())
+    finally:
+        async_client.close()
+    assert 1 < server.max_in_flight <= 3
+    assert results == [client.get_stacks_with_cards(board_id) for board_id in range(1, 10)]
+
+
+def test_shares_the_sync_connection_pool(server):
+    client = DeckAPIClient(server.url, 'usuario', 'clave', verify=False)
+    adapter = client.session.get_adapter(server.url)
+    client.get_boards()
+
+    async_client = AsyncDeckAPIClient(client, max_concurrency=4)
+    try:
+        asyncio.run(async_client.get_boards())
+        AsyncDeckAPIClient(client, max_concurrency=2).close()
+    finally:
+        async_client.close()
+    assert client.session.get_adapter(server.url) is adapter
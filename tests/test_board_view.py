@@ -0,0 +1,41 @@
+"""
+Confirmación de ids temporales en el tablero mostrado: si la fila o columna con el id definitivo
+ya existe (llegó antes en un refresco), se sustituye en lugar de duplicarse.
+"""
+from kanban_app import CardListModel
+
+
+def _card(card_id, title, order=0):
+    return {'id': card_id, 'title': title, 'order': order}
+
+
+def test_upsert_card_with_existing_real_id(qtbot):
+    model = CardListModel()
+    model.set_cards([_card(-1, 'Nueva'), _card(5, 'Otra', order=1)])
+    # El refresco ya ha insertado la tarjeta con su id definitivo
+    model.upsert_card(_card(7, 'Nueva', order=2))
+    assert model.rowCount() == 3
+
+    model.upsert_card(_card(7, 'Nueva confirmada', order=2), previous_id=-1)
+    assert [card['id'] for card in model._cards] == [5, 7]
+    assert model._cards[model.row_of(7)]['title'] == 'Nueva confirmada'
+
+
+def test_upsert_card_without_previous_row(qtbot):
+    model = CardListModel()
+    model.set_cards([_card(7, 'Nueva')])
+    model.upsert_card(_card(7, 'Nueva confirmada'), previous_id=-1)
+    assert [card['title'] for card in model._cards] == ['Nueva confirmada']
+
+
+def test_patch_stack_with_existing_real_id(app):
+    app.current_board_id = 1
+    app.patch_stack({'id': -1, 'title': 'Temporal', 'order': 0})
+    app.patch_stack({'id': 10, 'title': 'Temporal', 'order': 0})
+    assert app.board_layout.count() == 2
+
+    app.patch_stack({'id': 10, 'title': 'Confirmada', 'order': 0}, previous_id=-1)
+    assert set(app.stack_frames) == {10}
+    assert set(app.card_models) == {10}
+    assert app.board_layout.count() == 1
+    assert app.stack_frames[10].property('stack_id') == 10
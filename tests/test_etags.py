@@ -0,0 +1,61 @@
+"""
+Peticiones condicionales de la lista de tableros contra FakeDeckServer: el ETag solo se guarda
+después de guardar los tableros, y con él el servidor responde 304 sin volver a enviarlos.
+"""
+import pytest
+
+from data_manager import DataManager
+from deck_api_client import DeckAPIClient, NOT_MODIFIED
+from fake_deck_server import FakeDeckServer
+
+
+@pytest.fixture
+def server():
+    with FakeDeckServer(n_boards=3, n_stacks=1, n_cards=2) as server:
+        yield server
+
+
+@pytest.fixture
+def manager(tmp_path, server):
+    manager = DataManager(str(tmp_path / 'etags.db'))
+    manager.api = DeckAPIClient(server.url, 'usuario', 'clave', validator_store=manager.db, verify=False)
+    yield manager
+    manager.close()
+
+
+def test_boards_not_modified(manager, server):
+    assert [board['id'] for board in manager._load_boards()] == [1, 2, 3]
+    assert manager.db.get_etag('boards')
+
+    assert manager.api.get_boards() is NOT_MODIFIED
+    assert [board['id'] for board in manager._load_boards()] == [1, 2, 3]
+    assert server.not_modified_count == 2
+
+    # Si la lista cambia en el servidor, el ETag deja de coincidir y se guarda la nueva
+    server.n_boards = 2
+    assert [board['id'] for board in manager._load_boards()] == [1, 2]
+    assert server.not_modified_count == 2
+
+
+def test_boards_etag_not_saved_when_save_fails(manager, server, monkeypatch):
+    def failing_save(boards):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(manager.db, 'save_boards', failing_save)
+    with pytest.raises(OSError):
+        manager._load_boards()
+    assert manager.db.get_etag('boards') is None
+
+    # Sin ETag la siguiente petición vuelve a traer los tableros
+    monkeypatch.undo()
+    assert [board['id'] for board in manager._load_boards()] == [1, 2, 3]
+    assert server.not_modified_count == 0
+
+
+def test_refresh_all_boards_saves_boards_etag(manager, server):
+    manager.refresh_all_boards()
+    assert manager.db.get_etag('boards')
+    assert manager.db.get_etag('boards/1/stacks')
+    manager.refresh_all_boards()
+    # Tableros y pilas de los 3 tableros responden 304
+    assert server.not_modified_count == 4
@@ -0,0 +1,45 @@
+"""
+Caché local frente a cambios del servidor: ediciones locales que el siguiente refresco debe
+sobrescribir y tableros que desaparecen de la lista.
+"""
+from database_manager import DatabaseManager
+from fake_deck_server import make_stacks
+
+
+def test_refresh_overwrites_local_edit(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'edits.db'))
+    try:
+        db.save_boards([{'id': 1, 'title': 'Tablero'}])
+        stacks = make_stacks(1, 1, 3)
+        db.save_stacks_and_cards(1, stacks)
+        card = stacks[0]['cards'][0]
+
+        db.update_card_fields(card['id'], title='Editado en local', duedate='2031-05-01T00:00:00+00:00')
+        assert db.get_card(card['id'])['title'] == 'Editado en local'
+
+        db.save_stacks_and_cards(1, stacks)
+        refreshed = db.get_card(card['id'])
+        assert refreshed['title'] == card['title']
+        assert refreshed['duedate'] == card['duedate']
+    finally:
+        db.close()
+
+
+def test_vanished_board_is_purged(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'boards.db'))
+    try:
+        db.save_boards([{'id': 1, 'title': 'Uno'}, {'id': 2, 'title': 'Dos'}])
+        db.save_stacks_and_cards(1, make_stacks(1, 1, 4))
+        db.save_stacks_and_cards(2, make_stacks(2, 1, 4))
+        db.save_etag('boards/1/stacks', '"v1"')
+        assert {card['board_id'] for card in db.search_cards('Tarjeta')} == {1, 2}
+
+        # El tablero 1 ya no existe en el servidor (borrado o sin permisos)
+        db.save_boards([{'id': 2, 'title': 'Dos'}])
+        assert {card['board_id'] for card in db.search_cards('Tarjeta')} == {2}
+        assert {card['board_id'] for card in db.get_cards_due()} == {2}
+        assert {card['board_id'] for card in db.get_cards_with_label('Urgente')} == {2}
+        assert db.get_stacks(1) == []
+        assert db.get_etag('boards/1/stacks') is None
+    finally:
+        db.close()
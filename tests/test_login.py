@@ -0,0 +1,29 @@
+"""Inicio de sesión contra FakeDeckServer: la verificación de credenciales es la propia carga de tableros."""
+
+from data_manager import DataManager
+from fake_deck_server import FakeDeckServer
+
+
+def test_login_fetches_boards_once(tmp_path):
+    manager = DataManager(str(tmp_path / 'login.db'))
+    try:
+        with FakeDeckServer(n_boards=3, n_stacks=1, n_cards=1) as server:
+            assert manager.attempt_login(server.url, 'usuario', 'clave')
+            assert server.request_count == 1
+            assert [board['id'] for board in manager.get_boards()] == [1, 2, 3]
+            assert server.request_count == 1
+    finally:
+        manager.close()
+
+
+def test_login_fails_without_server(tmp_path):
+    manager = DataManager(str(tmp_path / 'login.db'))
+    try:
+        with FakeDeckServer() as server:
+            url = server.url
+        # El servidor ya está parado: la conexión se rechaza y no se guardan las credenciales
+        assert not manager.attempt_login(url, 'usuario', 'clave')
+        assert manager.api is None
+        assert manager.load_credentials() is None
+    finally:
+        manager.close()
@@ -0,0 +1,34 @@
+"""Las consultas con listas IN de distinto tamaño comparten una sola serie de db_execute_seconds."""
+import pytest
+
+from database_manager import DatabaseManager
+from fake_deck_server import make_stacks
+from metrics import metrics
+
+
+@pytest.fixture
+def enabled_metrics():
+    was_enabled = metrics.enabled
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.reset()
+    metrics.enabled = was_enabled
+
+
+def test_in_lists_share_one_statement_label(tmp_path, enabled_metrics):
+    db = DatabaseManager(str(tmp_path / 'metrics.db'))
+    try:
+        db.save_boards([{'id': 1, 'title': 'Tablero'}])
+        stacks = make_stacks(1, 1, 10)
+        db.save_stacks_and_cards(1, stacks)
+        card_ids = [card['id'] for card in stacks[0]['cards']]
+        for size in range(1, 11):
+            assert len(db.get_cards_by_ids(card_ids[:size])) == size
+    finally:
+        db.close()
+
+    statements = [h['labels']['statement'] for h in enabled_metrics.to_json()['histograms']
+                  if h['name'] == 'db_execute_seconds' and 'FROM cards WHERE id IN' in h['labels']['statement']]
+    assert len(statements) == 1
+    assert statements[0].endswith('WHERE id IN (…)')
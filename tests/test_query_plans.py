@@ -0,0 +1,90 @@
+"""
+Migraciones del esquema e índices de las consultas frecuentes: una base de datos anterior al
+versionado (user_version 0) se actualiza sin perder datos y las consultas usan los índices.
+"""
+import sqlite3
+
+import pytest
+
+from database_manager import DatabaseManager
+
+
+def _create_legacy_database(path):
+    """Esquema y datos tal y como los dejaba la versión sin migraciones."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE boards (id INTEGER PRIMARY KEY, title TEXT NOT NULL, color TEXT);
+        CREATE TABLE stacks (id INTEGER PRIMARY KEY, board_id INTEGER NOT NULL, title TEXT NOT NULL,
+                             "order" INTEGER, FOREIGN KEY (board_id) REFERENCES boards (id) ON DELETE CASCADE);
+        CREATE TABLE cards (id INTEGER PRIMARY KEY, stack_id INTEGER NOT NULL, board_id INTEGER NOT NULL,
+                            title TEXT NOT NULL, description TEXT, duedate TEXT, labels_json TEXT);
+        CREATE TABLE offline_changes (id INTEGER PRIMARY KEY AUTOINCREMENT, method TEXT NOT NULL,
+                                      endpoint TEXT NOT NULL, payload TEXT);
+        INSERT INTO boards VALUES (1, 'Tablero', 'ff0000');
+        INSERT INTO stacks VALUES (10, 1, 'Pila', 0);
+        INSERT INTO cards VALUES (100, 10, 1, 'Tarjeta', 'Descripción', '2030-01-01T12:00:00+00:00',
+                                  '[{"id": 5, "title": "Urgente", "color": "ff0000"}]');
+    """)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'kanban_data.db')
+    _create_legacy_database(path)
+    manager = DatabaseManager(path)
+    yield manager
+    manager.close()
+
+
+def _plan(db, sql, params=()):
+    rows = db._execute(f"EXPLAIN QUERY PLAN {sql}", params, fetchall=True)
+    return " | ".join(row['detail'] for row in rows)
+
+
+def _traced_plans(db, call):
+    """Planes de las sentencias que ejecuta call() en la conexión de lectura de este hilo."""
+    statements = []
+    conn = db._get_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return [_plan(db, sql) for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+
+def test_legacy_database_is_upgraded_in_place(db):
+    assert db._execute("PRAGMA user_version", fetchone=True)['user_version'] == len(DatabaseManager.MIGRATIONS)
+    card = db.get_card_detail(100)
+    assert card['description'] == 'Descripción'
+    assert card['due_at'] is not None
+    assert [label['title'] for label in db.get_labels(1)] == ['Urgente']
+
+
+def test_get_cards_uses_stack_order_index(db):
+    plans = _traced_plans(db, lambda: db.get_cards(10))
+    assert plans and all('INDEX idx_cards_stack_order (stack_id=?)' in plan for plan in plans)
+    assert all('TEMP B-TREE' not in plan for plan in plans)
+
+
+def test_get_stacks_uses_board_index(db):
+    plans = _traced_plans(db, lambda: db.get_stacks(1))
+    assert plans and all('INDEX idx_stacks_board_id (board_id=?)' in plan for plan in plans)
+
+
+def test_get_board_contents_uses_indexes(db):
+    [plan] = _traced_plans(db, lambda: db.get_board_contents(1))
+    assert 'idx_stacks_board_id (board_id=?)' in plan
+    assert 'idx_cards_stack_order (stack_id=?)' in plan
+    assert 'SCAN c' not in plan and 'SCAN cards' not in plan
+
+
+@pytest.mark.parametrize('table, index', [('cards', 'idx_cards_board_id'), ('stacks', 'idx_stacks_board_id')])
+def test_per_board_lookups_use_board_index(db, table, index):
+    # Las comparaciones de save_stacks_and_cards y los borrados por tablero
+    assert f'INDEX {index} (board_id=?)' in _plan(
+        db, f"SELECT id, content_hash FROM {table} WHERE board_id = ?", (1,))
+    assert f'INDEX {index} (board_id=?)' in _plan(db, f"DELETE FROM {table} WHERE board_id = ?", (1,))
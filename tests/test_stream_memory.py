@@ -0,0 +1,78 @@
+"""
+Pico de memoria al guardar un tablero leído por lotes (json_stream + save_stacks_and_cards_stream):
+debe depender del tamaño del lote y no del tamaño del tablero.
+"""
+import json
+import tracemalloc
+
+import pytest
+
+from database_manager import DatabaseManager
+from fake_deck_server import make_stacks
+from json_stream import StacksStreamParser, iter_batches
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _payload(n_cards):
+    """Cuerpo de boards/1/stacks con descripciones grandes, ya codificado."""
+    stacks = make_stacks(1, 4, n_cards // 4)
+    for stack in stacks:
+        for card in stack['cards']:
+            card['description'] = "Descripción de prueba " * 50
+    return json.dumps(stacks).encode()
+
+
+def _peak(save):
+    tracemalloc.start()
+    try:
+        save()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _streamed_peak(tmp_path, payload, batch_size):
+    db = DatabaseManager(str(tmp_path / f'stream_{len(payload)}_{batch_size}.db'))
+    try:
+        chunks = (payload[i:i + CHUNK_SIZE] for i in range(0, len(payload), CHUNK_SIZE))
+        batches = iter_batches(StacksStreamParser(chunks), batch_size)
+        return _peak(lambda: db.save_stacks_and_cards_stream(1, batches))
+    finally:
+        db.close()
+
+
+def _full_peak(tmp_path, payload):
+    db = DatabaseManager(str(tmp_path / f'full_{len(payload)}.db'))
+    try:
+        return _peak(lambda: db.save_stacks_and_cards(1, json.loads(payload)))
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope='module')
+def payloads():
+    return {n_cards: _payload(n_cards) for n_cards in (1000, 4000)}
+
+
+def test_peak_does_not_grow_with_board_size(tmp_path, payloads):
+    small = _streamed_peak(tmp_path, payloads[1000], batch_size=100)
+    large = _streamed_peak(tmp_path, payloads[4000], batch_size=100)
+    # Cuatro veces más tarjetas; el pico solo puede crecer por las listas de ids de los cambios
+    assert large < small * 1.5
+
+
+def test_peak_is_bounded_by_batch_size(tmp_path, payloads):
+    payload = payloads[4000]
+    per_card = len(payload) / 4000
+    small_batches = _streamed_peak(tmp_path, payload, batch_size=50)
+    large_batches = _streamed_peak(tmp_path, payload, batch_size=1000)
+    assert small_batches < large_batches
+    # Lotes de 50 tarjetas: el pico es del orden de unos pocos lotes, no del cuerpo entero
+    assert small_batches < per_card * 50 * 20
+    assert small_batches < len(payload) / 4
+
+
+def test_streaming_uses_less_memory_than_full_parse(tmp_path, payloads):
+    payload = payloads[4000]
+    assert _streamed_peak(tmp_path, payload, batch_size=100) < _full_peak(tmp_path, payload) / 4
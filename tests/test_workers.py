@@ -0,0 +1,31 @@
+"""
+Reemplazo de peticiones con key en KanbanApp.run_worker: una petición nueva con la misma key
+cancela la anterior aunque esta ya haya terminado y el pool la haya soltado.
+"""
+
+
+def test_supersede_finished_worker(app, qtbot):
+    results = []
+    first = app.run_worker(lambda: 'primero', results.append, "Error", key='board', token=1)
+    # El worker termina en el pool pero su señal finished aún no se ha procesado en el hilo de la GUI,
+    # así que sigue siendo la petición en curso de la key
+    app.threadpool.waitForDone()
+    assert app.keyed_workers['board'] is first
+
+    second = app.run_worker(lambda: 'segundo', results.append, "Error", key='board', token=2)
+    assert second is not first
+    assert first.cancelled
+    qtbot.waitUntil(lambda: results == ['segundo'])
+
+
+def test_supersede_running_worker(app, qtbot):
+    results = []
+    app.threadpool.setMaxThreadCount(1)
+    first = app.run_worker(lambda: 'primero', results.append, "Error", key='board', token=1)
+    second = app.run_worker(lambda: 'segundo', results.append, "Error", key='board', token=2)
+    app.threadpool.waitForDone()
+    qtbot.waitUntil(lambda: 'segundo' in results)
+    qtbot.wait(50)
+    # El resultado de la petición reemplazada nunca llega a los callbacks
+    assert results == ['segundo']
+    assert first.cancelled and not second.cancelled